@@ -5,53 +5,106 @@ from bson.objectid import ObjectId
 
 from v2.routers.src.util import Util
 from core.error import CustomException
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
+from core.common.metrics import metrics
+from core.common.cache import LRUCache
 
 import os
+import time
+import hashlib
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
 from jose import jwt, ExpiredSignatureError
 from datetime import datetime, timedelta
 
 
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", scheme_name="JWT")
 
+load_dotenv()
+# bcrypt 연산은 이 pool에서만 실행된다. (동시에 실행되는 hash/verify 수 = worker 수)
+HASH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('AUTH_HASH_WORKERS', min(4, os.cpu_count() or 1))),
+    thread_name_prefix='bcrypt'
+    )
+# 존재하지 않는다고 확인된 (collection, field, value) (id, store name 입력 중 반복되는 중복 확인용)
+# 다른 process에서 생성된 값은 ttl 동안 "사용 가능"으로 보일 수 있으나 unique index가 최종적으로 막는다.
+AVAILABLE = LRUCache('available', maxsize=8192, ttl=float(os.environ.get('AVAILABLE_CACHE_TTL', '10')))
+
 
 class AuthManagement:
     def __init__(self):
         self.pw_handler = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+    async def run_hash(self, operation:str, func, *args):
+        """ bcrypt 연산을 HASH_EXECUTOR에서 실행하여 event loop를 막지 않도록 한다.
+            대기 시간(auth_hash_queue_ms)과 실행 시간(auth_hash_run_ms)을 metric으로 기록한다. """
+        submitted = time.perf_counter()
+
+        def job():
+            start = time.perf_counter()
+            metrics.histogram('auth_hash_queue_ms', operation=operation).observe((start - submitted) * 1000)
+            try:
+                return func(*args)
+            finally:
+                metrics.histogram('auth_hash_run_ms', operation=operation).observe((time.perf_counter() - start) * 1000)
+
+        return await asyncio.get_running_loop().run_in_executor(HASH_EXECUTOR, job)
     
-    def check_dup(self, collection:str, field:str) -> dict:
-        try:
-            user = DB.read_one(collection, field)
-        except:
+    async def exists(self, collection:str, field:str, value:str) -> bool:
+        """ collection에 field 값이 value인 document가 있는지 확인한다. (id, store name 중복 확인)
+            없다고 확인된 값은 AVAILABLE_CACHE_TTL 동안 DB 조회 없이 응답한다. """
+        key = (collection, field, value)
+        if AVAILABLE.get(key, False):
             return False
-        return user
 
-    def get_uid(self, id:str):        
-        user = self.check_dup('user', {'id':id})
+        if await DB.exists(collection, {field:value}):
+            return True
 
-        if user:
-            return user['_id']
-        raise CustomException(status_code=401.1)
+        AVAILABLE.set(key, True)
+        return False
+
+    def mark_taken(self, collection:str, field:str, value:str) -> None:
+        """ value가 사용되었으므로 "사용 가능" cache에서 제거한다. """
+        AVAILABLE.invalidate((collection, field, value))
+
+    async def get_uid(self, id:str):
+        try:
+            user = await DB.read_one('user', {'id':id}, {'_id':1})
+        except CustomException:
+            raise CustomException(status_code=401.1)
 
-    def get_hashed_pw(self, pw: str) -> str:
-        return self.pw_handler.hash(pw)
+        return user['_id']
+
+    async def get_hashed_pw(self, pw: str) -> str:
+        return await self.run_hash('hash', self.pw_handler.hash, pw)
     
-    def auth_pw(self, plain_pw:str, hashed_pw:str):
-        if self.pw_handler.verify(plain_pw, hashed_pw):
+    async def auth_pw(self, plain_pw:str, hashed_pw:str):
+        if await self.run_hash('verify', self.pw_handler.verify, plain_pw, hashed_pw):
             return True
         raise CustomException(status_code=401.1)
         
-    def auth_user(self, u_id, pw):
+    async def auth_user(self, u_id, pw):
         u_id = Util.check_id(u_id)
-        user = DB.read_one('user', {'_id':ObjectId(u_id)})
+        user = await DB.read_one('user', {'_id':ObjectId(u_id)})
 
         if user:
-            self.auth_pw(pw, user['pw'])
+            await self.auth_pw(pw, user['pw'])
         else:
             raise CustomException(status_code=401.1)
         
         return user
+
+    async def login(self, id:str, pw:str) -> str:
+        """ id로 사용자를 한 번만 조회(_id, pw만)하여 비밀번호를 확인하고 u_id를 반환한다. """
+        try:
+            user = await DB.read_one('user', {'id':id}, {'pw':1})
+        except CustomException:
+            raise CustomException(status_code=401.1)
+
+        await self.auth_pw(pw, user['pw'])
+        return user['_id']
     
 
 
@@ -70,6 +123,9 @@ class TokenManagement:
 
         self.ACCESS_SK = os.environ['JWT_ACCESS_SECRET_KEY']
         self.REFRESH_SK = os.environ['JWT_REFRESH_SECRET_KEY']
+
+        # 검증이 끝난 token의 payload (key: token 종류 + token digest, token의 exp까지 유효)
+        self.payload_cache = LRUCache('token_payload', maxsize=int(os.environ.get('TOKEN_CACHE_SIZE', '4096')))
     
     def init_a_token(self, u_id:str, scope:str):
         if scope == "buyer":
@@ -124,12 +180,22 @@ class TokenManagement:
         
 
     def get_payload(self, field:str, token:str):
+        """ token을 검증하고 payload를 반환한다. 한 번 검증된 token은 만료 시각까지 cache된 payload를 사용한다. """
+        key = (field, hashlib.sha256(token.encode()).digest())
+        payload = self.payload_cache.get(key)
+        if payload is not None:
+            return payload
+
         SK = self.ACCESS_SK if field == 'access' else self.REFRESH_SK
         try:
-            return jwt.decode(token, SK, algorithms=self.algorithm)
+            payload = jwt.decode(token, SK, algorithms=self.algorithm)
             
         except ExpiredSignatureError:
             raise CustomException(status_code=401.62)
+
+        if 'exp' in payload:
+            self.payload_cache.set(key, payload, expire_at=payload['exp'])
+        return payload
     
 
     def auth_a_token(self, token: str = Depends(oauth2_scheme)):
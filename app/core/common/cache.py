@@ -0,0 +1,182 @@
+"""
+Cache
+
+    process 내부에서 사용하는 LRU cache와 local disk cache. 조회 결과는 metric(cache_hits, cache_misses)으로 기록된다.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+
+from core.common.metrics import metrics
+
+
+class LRUCache:
+    """ 최대 개수(maxsize)와 유효 시간(ttl, 초)을 가지는 LRU cache
+
+        - ttl이 None이면 만료되지 않고, set() 호출 시 항목별로 만료 시각(expire_at)을 지정할 수도 있다.
+        - key가 tuple이면 첫 번째 요소를 tag로 보고 invalidate_tag()로 한 번에 삭제할 수 있다.
+        - maxbytes가 주어지면 set() 호출 시 전달한 size의 합이 maxbytes를 넘지 않도록 유지한다.
+    """
+    MISSING = object()
+
+    def __init__(self, name:str, maxsize:int = 1024, ttl:float = None, maxbytes:int = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = metrics.counter('cache_hits', cache=name)
+        self.misses = metrics.counter('cache_misses', cache=name)
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None:
+                expire_at, value, size = item
+                if expire_at is None or expire_at > time.time():
+                    self.data.move_to_end(key)
+                    self.hits.inc()
+                    return value
+                del self.data[key]
+                self.bytes -= size
+
+        self.misses.inc()
+        return default
+
+    def set(self, key, value, expire_at:float = None, size:int = 0) -> None:
+        if expire_at is None and self.ttl is not None:
+            expire_at = time.time() + self.ttl
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+
+        with self.lock:
+            old = self.data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.data[key] = (expire_at, value, size)
+            self.bytes += size
+            while len(self.data) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+                self.bytes -= self.data.popitem(last=False)[1][2]
+
+    async def get_or_load(self, key, loader):
+        """ cache에 없으면 loader(coroutine function)를 실행하여 결과를 저장한 뒤 반환한다. """
+        value = self.get(key, LRUCache.MISSING)
+        if value is LRUCache.MISSING:
+            value = await loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key) -> None:
+        with self.lock:
+            item = self.data.pop(key, None)
+            if item is not None:
+                self.bytes -= item[2]
+
+    def invalidate_tag(self, tag) -> None:
+        self.invalidate_where(lambda k: isinstance(k, tuple) and k and k[0] == tag)
+
+    def invalidate_where(self, predicate) -> None:
+        """ predicate(key)가 True인 항목을 모두 삭제한다. """
+        with self.lock:
+            for key in [k for k in self.data if predicate(k)]:
+                self.bytes -= self.data.pop(key)[2]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+            self.bytes = 0
+
+
+class DiskCache:
+    """ local disk에 bytes를 저장하는 cache (한 번 저장되면 변경되지 않는 object 용)
+
+        - key(str)의 sha256 값을 파일 이름으로 사용하며, 파일은 임시 파일에 쓴 뒤 os.replace로 교체한다.
+        - 전체 크기가 maxbytes를 넘으면 가장 오래 사용되지 않은(mtime 기준) 파일부터 삭제한다.
+    """
+
+    def __init__(self, name:str, directory:str, maxbytes:int):
+        self.name = name
+        self.directory = directory
+        self.maxbytes = maxbytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.bytes = sum(entry.stat().st_size for entry in self.entries())
+
+        self.hits = metrics.counter('cache_hits', cache=name)
+        self.misses = metrics.counter('cache_misses', cache=name)
+
+    def path(self, key:str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def entries(self) -> list:
+        result = []
+        for sub in os.scandir(self.directory):
+            if sub.is_dir():
+                result.extend(entry for entry in os.scandir(sub.path) if entry.is_file() and '.tmp' not in entry.name)
+        return result
+
+    def get(self, key:str) -> bytes | None:
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses.inc()
+            return None
+
+        # 읽은 뒤 다른 thread/process의 evict()가 파일을 지웠을 수 있다. 이미 읽은 data는 그대로 사용한다.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits.inc()
+        return data
+
+    def set(self, key:str, data:bytes) -> None:
+        if len(data) > self.maxbytes:
+            return
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self.lock:
+            self.bytes += len(data) - old_size
+            if self.bytes > self.maxbytes:
+                self.evict()
+
+    def evict(self) -> None:
+        """ 전체 크기가 maxbytes의 90% 이하가 될 때까지 오래된 파일부터 삭제한다. """
+        entries = sorted(self.entries(), key=lambda entry: entry.stat().st_mtime)
+        self.bytes = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.bytes <= self.maxbytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.bytes -= size
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, key:str) -> None:
+        try:
+            path = self.path(key)
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            self.bytes -= size
@@ -0,0 +1,49 @@
+"""
+index bootstrap / report
+
+    app 시작 시 core.models.index에 선언된 index를 생성하고,
+    `python -m core.common.index` 로 누락/미사용 index와 대표 query의 실행 계획을 출력한다.
+"""
+
+import json
+
+from core.common.mongo import MongodbController
+from core.error.exception import CustomException
+from core.models.index import INDEXES, SUPERSEDED_INDEXES, HOT_QUERIES
+
+
+def ensure_indexes(DB:str = 'FIE_DB2') -> None:
+    controller = MongodbController(DB)
+    for collection, indexes in INDEXES.items():
+        try:
+            names = controller.ensure_indexes(collection, indexes, SUPERSEDED_INDEXES.get(collection, []))
+            print(f'# INDEX {collection}: {names}')
+        except CustomException as e:
+            print(f'# INDEX {collection}: skipped ({e.status_code} {e.detail})')
+        except Exception as e:
+            print(f'# INDEX {collection}: failed ({e})')
+
+
+def report(DB:str = 'FIE_DB2') -> dict:
+    controller = MongodbController(DB)
+    result = {}
+    for collection, indexes in INDEXES.items():
+        try:
+            result[collection] = controller.index_report(collection, indexes, HOT_QUERIES.get(collection, []))
+        except CustomException as e:
+            result[collection] = {'error': f'{e.status_code} {e.detail}'}
+    return result
+
+
+if __name__ == '__main__':
+    for collection, r in report().items():
+        print(f'[{collection}]')
+        if 'error' in r:
+            print(f'  error   : {r["error"]}')
+            continue
+        print(f'  missing : {r["missing"]}')
+        print(f'  conflict: {r["conflicts"]}')
+        print(f'  unused  : {r["unused"]}')
+        for plan in r['plans']:
+            print(f'  {plan["query"]} -> {" <- ".join(plan["stages"])}')
+            print('    ' + json.dumps(plan['winningPlan'], default=str))
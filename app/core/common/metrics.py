@@ -0,0 +1,101 @@
+"""
+Metrics
+
+    process 내부에서 측정값(histogram)과 횟수(counter)를 모아두는 저장소.
+    `/api/v2/metrics` 에서 snapshot을 확인할 수 있다.
+"""
+
+import bisect
+import threading
+
+
+class Histogram:
+    """ 측정값의 분포를 bucket 단위로 기록한다. (bucket은 상한값, 마지막은 +Inf) """
+
+    DEFAULT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, buckets:tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value:float) -> None:
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            buckets = {f'<={b}': c for b, c in zip(self.buckets, self.counts)}
+            buckets['+Inf'] = self.counts[-1]
+            return {
+                'count': self.count,
+                'sum': round(self.sum, 3),
+                'avg': round(self.sum / self.count, 3) if self.count else 0,
+                'max': round(self.max, 3),
+                'buckets': buckets
+            }
+
+
+class Counter:
+    """ 누적 횟수를 기록한다. """
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount:int = 1) -> None:
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Metrics:
+    """ 이름과 label 조합마다 하나의 Histogram/Counter를 생성하여 보관한다. """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name:str, buckets:tuple = Histogram.DEFAULT_BUCKETS, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.histograms:
+            with self.lock:
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+        return self.histograms[key]
+
+    def counter(self, name:str, **labels) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.counters:
+            with self.lock:
+                if key not in self.counters:
+                    self.counters[key] = Counter()
+        return self.counters[key]
+
+    def snapshot(self) -> dict:
+        result = {'histograms': {}, 'counters': {}}
+        for (name, labels), histogram in list(self.histograms.items()):
+            result['histograms'].setdefault(name, []).append({**dict(labels), **histogram.snapshot()})
+        for (name, labels), counter in list(self.counters.items()):
+            result['counters'].setdefault(name, []).append({**dict(labels), 'value': counter.snapshot()})
+
+        # cache 별 적중률 (cache_hits / (cache_hits + cache_misses))
+        result['cache_hit_rate'] = {}
+        for hit in result['counters'].get('cache_hits', []):
+            miss = self.counter('cache_misses', cache=hit['cache']).snapshot()
+            total = hit['value'] + miss
+            result['cache_hit_rate'][hit['cache']] = round(hit['value'] / total, 4) if total else None
+        return result
+
+
+metrics = Metrics()
@@ -1,40 +1,193 @@
 import os
+import json
+import time
+import inspect
+import functools
+import threading
 from dotenv import load_dotenv
-from pymongo import MongoClient
+import pytz
+from pymongo import MongoClient, ReturnDocument
+from bson.codec_options import CodecOptions
+from fastapi.concurrency import run_in_threadpool
 
 from bson.objectid import ObjectId
 
 from core.error.exception import CustomException
+from core.common.metrics import metrics
+
+# DB에서 읽은 datetime은 Asia/Seoul timezone이 적용된 상태로 반환된다. (router에서 Util.get_local_time 변환 불필요)
+CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=pytz.timezone('Asia/Seoul'))
 
 def objectIdToStr(d:dict) -> dict:
+    """ document 안의 ObjectId를 중첩된 dict, list까지 한 번의 순회로 str로 변환한다. """
     for k, v in d.items():
-        if type(v) is ObjectId:
+        t = type(v)
+        if t is ObjectId:
             d[k] = str(v)
+        elif t is dict:
+            objectIdToStr(v)
+        elif t is list:
+            listObjectIdToStr(v)
 
     return d
-            
+
+def listObjectIdToStr(l:list) -> list:
+    for i, v in enumerate(l):
+        t = type(v)
+        if t is ObjectId:
+            l[i] = str(v)
+        elif t is dict:
+            objectIdToStr(v)
+        elif t is list:
+            listObjectIdToStr(v)
+
+    return l
+
+def plan_stages(plan:dict) -> list:
+    """ explain()의 winningPlan을 따라가며 stage 이름(index 사용 시 index 이름 포함)을 나열한다. """
+    plan = plan.get('queryPlan', plan)
+    stage = plan.get('stage', '')
+    if 'indexName' in plan:
+        stage = f'{stage}({plan["indexName"]})'
+
+    stages = [stage]
+    if 'inputStage' in plan:
+        stages += plan_stages(plan['inputStage'])
+    for input_stage in plan.get('inputStages', []):
+        stages += plan_stages(input_stage)
+    return stages
+
+def index_spec(key, unique:bool = False) -> tuple:
+    """ index 비교용 (key, unique) 값. key는 [(field, direction)] 또는 {field: direction} 형식이다. """
+    if isinstance(key, dict):
+        key = key.items()
+    return tuple((field, int(direction)) for field, direction in key), bool(unique)
+
+def query_shape(query):
+    """ query의 값들을 타입 이름으로 바꾸어 같은 형태의 query끼리 묶을 수 있도록 한다. """
+    if isinstance(query, dict):
+        return {k: query_shape(v) for k, v in query.items()}
+    if isinstance(query, list):
+        if query and all(isinstance(v, dict) for v in query):
+            return [query_shape(v) for v in query]
+        return 'list'
+    return type(query).__name__
+
+def document_count(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result
+    return 1
+
+DOCUMENT_BUCKETS = (0, 1, 10, 100, 1000, 10000)
+
+def instrument(operation:str, query_arg:str = 'query'):
+    """ MongodbController 메소드의 실행 시간, 반환 문서 수를 histogram에 기록하고
+        slow_query_ms 이상 걸린 query는 explain() 결과와 함께 출력한다. (MONGO_QUERY_METRICS=1 일 때만 동작) """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, collection:str, *args, **kwargs):
+            if not self.metrics_enabled:
+                return method(self, collection, *args, **kwargs)
+
+            result = None
+            start = time.perf_counter()
+            try:
+                result = method(self, collection, *args, **kwargs)
+                return result
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                query = signature.bind(self, collection, *args, **kwargs).arguments.get(query_arg) if query_arg else None
+                shape = json.dumps(query_shape(query), sort_keys=True)
+
+                labels = {'collection': collection, 'operation': operation, 'shape': shape}
+                metrics.histogram('mongo_query_ms', **labels).observe(elapsed)
+                metrics.histogram('mongo_query_docs', DOCUMENT_BUCKETS, **labels).observe(document_count(result))
+
+                if elapsed >= self.slow_query_ms:
+                    self.log_slow_query(collection, operation, query, shape, elapsed)
+
+        return wrapper
+    return decorator
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> MongoClient:
+    """ 프로세스 전체에서 공유하는 MongoClient(connection pool)를 반환한다. 최초 호출 시에 생성한다. """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                load_dotenv()
+                _client = MongoClient(os.environ['DATABASE_URL'])
+    return _client
+
+def close_client() -> None:
+    """ 공유 MongoClient를 닫는다. (app shutdown 시 호출) """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
 class MongodbController:
-    """ 몽고디비를 통해 특정 DATABASE의 Collections에 CRUD를 하도록 돕는 클래스 """
-    
-    def __init__(self, DB:str) -> None:
+    """ 몽고디비를 통해 특정 DATABASE의 Collections에 CRUD를 하도록 돕는 클래스
+
+        DB 이름마다 하나의 인스턴스만 생성되며, 모든 인스턴스는 공유 MongoClient를 사용한다.
+        DB, collection 확인은 생성 시점이 아니라 처음 사용할 때 수행한다.
+    """
+    _instances = {}
+
+    def __new__(cls, DB:str):
+        if DB not in cls._instances:
+            instance = super().__new__(cls)
+            instance.initialize(DB)
+            cls._instances[DB] = instance
+        return cls._instances[DB]
+
+    def initialize(self, DB:str):
         load_dotenv()
 
-        client = MongoClient(os.environ['DATABASE_URL'])
-        db_names = client.list_database_names()
-        
-        if DB in db_names:
-            self.db = client[DB]
-        else:
-            raise CustomException(503.51, f'DB: \'{DB}\'')
+        self.name = DB
+        self._db = None
+        self._collections = None
+
+        self.metrics_enabled = os.environ.get('MONGO_QUERY_METRICS', '0') == '1'
+        self.slow_query_ms = float(os.environ.get('MONGO_SLOW_QUERY_MS', '100'))
+
+    @property
+    def db(self):
+        if self._db is None:
+            client = get_client()
+            if self.name not in client.list_database_names():
+                raise CustomException(503.51, f'DB: \'{self.name}\'')
+            self._db = client.get_database(self.name, codec_options=CODEC_OPTIONS)
+        return self._db
+
+    @property
+    def collections(self) -> set:
+        if self._collections is None:
+            self._collections = set(self.db.list_collection_names())
+        return self._collections
 
-        self.collections = self.db.list_collection_names()
-    
     def get_collection(self, name:str):
+        if name not in self.collections:
+            # 다른 process에서 새로 생성된 collection일 수 있으므로 한 번 더 확인한다.
+            self._collections = None
+
         if name in self.collections:
             return self.db[name]
         else:
             raise CustomException(503.52, f'collection: \'{name}\'')
         
+    @instrument('insert_one', None)
     def insert_one(self, collection:str, data:dict) -> ObjectId:
         """ 딕셔너리를 받아서 collection에 새로운 document를 추가한다. """
         assert collection, data is not None
@@ -48,6 +201,35 @@ class MongodbController:
 
         return result.inserted_id
 
+    @instrument('insert_many', None)
+    def insert_many(self, collection:str, data:list) -> list:
+        """ 딕셔너리 목록을 한 번의 요청으로 collection에 추가하고, 입력 순서대로 ObjectId 목록을 반환한다. """
+        assert collection and data
+
+        coll = self.get_collection(collection)
+
+        result = coll.insert_many(data, ordered=True)
+
+        if result.acknowledged is False:
+            raise CustomException(503.53)
+
+        return result.inserted_ids
+
+    @instrument('bulk_write', None)
+    def bulk_write(self, collection:str, requests:list, ordered:bool=True):
+        """ pymongo write operation(InsertOne, UpdateOne, ...) 목록을 한 번의 요청으로 실행한다. """
+        assert collection and requests
+
+        coll = self.get_collection(collection)
+
+        result = coll.bulk_write(requests, ordered=ordered)
+
+        if result.acknowledged is False:
+            raise CustomException(503.54)
+
+        return result
+
+    @instrument('replace_one')
     def replace_one(self, collection:str, query:dict, data:dict) -> bool:
         """ query와 일치하는 document의 내용을 변경한다. """
         assert collection and data is not None
@@ -63,6 +245,7 @@ class MongodbController:
 
         return True
     
+    @instrument('update_one')
     def update_one(self, collection:str, query:dict, fields:dict) -> bool:
         """ query와 일치하는 document의 내용을 변경한다. """
         assert collection and fields is not None
@@ -80,29 +263,103 @@ class MongodbController:
         return True
     
 
-    def read_one(self, collection:str, query:dict) -> dict:
-        """ query와 일치하는 document를 하나 읽어온다. """
+    @instrument('find_one_and_update')
+    def find_one_and_update(self, collection:str, query:dict, update:dict, fields:dict = None) -> dict | None:
+        """ query와 일치하는 document 하나를 update 연산자($set, $inc 등)로 원자적으로 변경하고 변경된 document를 반환한다.
+            query를 조건(guard)으로 사용할 수 있으며, 일치하는 document가 없으면 None을 반환한다. """
+        assert collection and update is not None
+
+        coll = self.get_collection(collection)
+
+        result = coll.find_one_and_update(query, update, projection=fields, return_document=ReturnDocument.AFTER)
+        if result is None:
+            return None
+
+        return objectIdToStr(result)
+
+    @instrument('read_one')
+    def read_one(self, collection:str, query:dict, fields:dict = None) -> dict:
+        """ query와 일치하는 document를 하나 읽어온다. fields(projection)가 주어지면 해당 field만 읽어온다. """
         assert collection is not None
         coll = self.get_collection(collection)
 
-        result = coll.find_one(query)
+        result = coll.find_one(query, fields)
         if result is None:
             raise CustomException(503.55)
         
         return objectIdToStr(result)
     
-    def read_all(self, collection:str, query:dict = {}, fields:dict = None, asc_by: str=None, asc:bool=True) -> dict:
-        """ query와 일치하는 모든 문서들을 받아온다. 정렬 조건이 존재할 시 반영한다. """
+    @instrument('exists')
+    def exists(self, collection:str, query:dict) -> bool:
+        """ query와 일치하는 document가 있는지 확인한다. (_id만 최대 1개 읽어오며 document를 변환하지 않는다) """
+        assert collection is not None
+        coll = self.get_collection(collection)
+
+        return next(coll.find(query, {'_id':1}).limit(1), None) is not None
+
+    @instrument('read_many_by_ids', 'ids')
+    def read_many_by_ids(self, collection:str, ids:list, fields:dict = None) -> list:
+        """ id 목록에 해당하는 document들을 한 번의 $in 쿼리로 읽어와 요청한 순서대로 반환한다.
+            하나라도 존재하지 않으면 read_one과 같이 예외를 발생시킨다. """
+        assert collection is not None
+        coll = self.get_collection(collection)
+
+        object_ids = []
+        for id in ids:
+            if not ObjectId.is_valid(id):
+                raise CustomException(503.71, f'id: \'{id}\'')
+            object_ids.append(ObjectId(id))
+
+        if not object_ids:
+            return []
+
+        result = coll.find({'_id': {'$in': list(set(object_ids))}}, fields)
+
+        documents = {}
+        for r in result:
+            document = objectIdToStr(r)
+            documents[document['_id']] = document
+
+        response = []
+        for _id in object_ids:
+            document = documents.get(str(_id))
+            if document is None:
+                raise CustomException(503.55, f'id: \'{_id}\'')
+            response.append(document)
+
+        return response
+
+    @instrument('read_all')
+    def read_all(self, collection:str, query:dict = {}, fields:dict = None, asc_by: str=None, asc:bool=True,
+                 skip:int = 0, limit:int = 0, after:dict = None) -> list:
+        """ query와 일치하는 모든 문서들을 받아온다. 정렬 조건이 존재할 시 반영한다.
+            - fields: 받아올 field (projection)
+            - skip, limit: 건너뛸 문서 수, 받아올 최대 문서 수 (0이면 제한 없음)
+            - after: 이전 페이지의 마지막 문서. (asc_by, _id) 기준으로 그 다음 문서부터 받아온다. (keyset pagination)
+        """
         assert collection is not None
         coll = self.get_collection(collection)
 
+        if after is not None:
+            assert asc_by is not None
+            query = {'$and': [query, self.keyset_query(asc_by, asc, after)]} if query else self.keyset_query(asc_by, asc, after)
+
         if fields == None:
             result = coll.find(query)
         else: 
             result = coll.find(query, fields)
 
         if asc_by:
-            result.sort([(asc_by, 1 if asc else -1)])
+            direction = 1 if asc else -1
+            if asc_by == '_id':
+                result.sort([('_id', direction)])
+            else:
+                result.sort([(asc_by, direction), ('_id', direction)])
+
+        if skip:
+            result.skip(skip)
+        if limit:
+            result.limit(limit)
 
         if result is None:
             raise CustomException(503.55)
@@ -113,6 +370,128 @@ class MongodbController:
         
         return response 
 
+    @staticmethod
+    def keyset_query(asc_by:str, asc:bool, after:dict) -> dict:
+        """ (asc_by, _id) 정렬 순서에서 after 문서 다음에 오는 문서들을 찾는 query를 만든다. """
+        op = '$gt' if asc else '$lt'
+        last_id = ObjectId(after['_id'])
+
+        if asc_by == '_id':
+            return {'_id': {op: last_id}}
+
+        return {'$or': [
+            {asc_by: {op: after[asc_by]}},
+            {asc_by: after[asc_by], '_id': {op: last_id}}
+        ]}
+
+    @instrument('count_documents')
+    def count_documents(self, collection:str, query:dict = {}, limit:int = 0) -> int:
+        """ query와 일치하는 문서의 수를 문서를 받아오지 않고 센다. limit이 주어지면 limit개까지만 센다. """
+        assert collection is not None
+        coll = self.get_collection(collection)
+
+        if limit:
+            return coll.count_documents(query, limit=limit)
+        return coll.count_documents(query)
+
+    def ensure_indexes(self, collection:str, indexes:list, superseded:list = []) -> list:
+        """ collection에 index(IndexModel 목록)가 존재하도록 보장한다. 이미 존재하는 index는 그대로 둔다.
+
+            superseded: 선언된 index로 대체된 이전 index 이름 목록. 같은 key에 index가 둘 있을 수 없으므로(IndexOptionsConflict)
+            목록에 있는 index만 지우고 선언된 index를 만든다. unique index로 대체할 때 중복 값이 있으면 지우지 않고 건너뛴다.
+            그 밖의 key, 이름 불일치는 건드리지 않고 index_report의 conflicts로 보고한다.
+        """
+        coll = self.get_collection(collection)
+
+        existing = coll.index_information()
+        skipped = set()
+        for name in superseded:
+            if name not in existing:
+                continue
+            key = index_spec(existing[name]['key'])[0]
+            replacement = next((index for index in indexes if index_spec(index.document['key'])[0] == key), None)
+            if replacement is not None and replacement.document.get('unique') and self.has_duplicates(coll, key):
+                print(f'# INDEX {collection}: keep \'{name}\', duplicate values block \'{replacement.document["name"]}\'')
+                skipped.add(replacement.document['name'])
+                continue
+
+            print(f'# INDEX {collection}: drop superseded \'{name}\'')
+            coll.drop_index(name)
+
+        indexes = [index for index in indexes if index.document['name'] not in skipped]
+        return coll.create_indexes(indexes) if indexes else []
+
+    @staticmethod
+    def has_duplicates(coll, key:tuple) -> bool:
+        """ key(index_spec의 key) 값이 같은 document가 둘 이상 있는지 확인한다. """
+        group = {field: f'${field}' for field, _ in key}
+        pipeline = [
+            {'$group': {'_id': group, 'count': {'$sum': 1}}},
+            {'$match': {'count': {'$gt': 1}}},
+            {'$limit': 1}
+        ]
+        return next(coll.aggregate(pipeline), None) is not None
+
+    def index_report(self, collection:str, indexes:list, queries:list = []) -> dict:
+        """ 선언된 index 중 존재하지 않는 것(key, unique 기준), 같은 key에 이름이나 unique 여부가 다른 index가 있는 것,
+            생성 이후 사용되지 않은 것, 대표 query들의 실행 계획을 반환한다. """
+        coll = self.get_collection(collection)
+
+        existing = {}
+        for name, info in coll.index_information().items():
+            existing[name] = index_spec(info['key'], info.get('unique'))
+
+        missing = []
+        conflicts = []
+        for index in indexes:
+            spec = index_spec(index.document['key'], index.document.get('unique'))
+            if spec not in existing.values():
+                missing.append(index.document['name'])
+            for name, other in existing.items():
+                if other[0] == spec[0] and (name != index.document['name'] or other[1] != spec[1]):
+                    conflicts.append(f'{index.document["name"]} <- {name} (unique={other[1]})')
+
+        unused = []
+        for stat in coll.aggregate([{'$indexStats': {}}]):
+            if stat['name'] != '_id_' and stat['accesses']['ops'] == 0:
+                unused.append(stat['name'])
+
+        plans = []
+        for query in queries:
+            cursor = coll.find(query['filter'])
+            if 'sort' in query:
+                cursor.sort(query['sort'])
+            winning_plan = cursor.explain()['queryPlanner']['winningPlan']
+            plans.append({
+                'query': query['name'],
+                'stages': plan_stages(winning_plan),
+                'winningPlan': winning_plan
+            })
+
+        return {
+            'missing': missing,
+            'conflicts': conflicts,
+            'unused': unused,
+            'plans': plans
+        }
+
+    def log_slow_query(self, collection:str, operation:str, query, shape:str, elapsed:float) -> None:
+        """ 느린 query의 형태와 실행 계획을 출력한다. (값은 출력하지 않음) """
+        try:
+            if operation == 'aggregate':
+                explain = self.db.command('explain', {'aggregate': collection, 'pipeline': query, 'cursor': {}}, verbosity='queryPlanner')
+                plan = explain['stages'][0]['$cursor']['queryPlanner']['winningPlan'] if 'stages' in explain else explain['queryPlanner']['winningPlan']
+            elif isinstance(query, dict):
+                plan = self.get_collection(collection).find(query).explain()['queryPlanner']['winningPlan']
+            else:
+                plan = None
+        except Exception as e:
+            plan = {'stage': f'explain failed ({e})'}
+
+        stages = ' <- '.join(plan_stages(plan)) if plan else '-'
+        print(f'# SLOW QUERY {elapsed:.1f}ms {collection}.{operation} {shape}')
+        print(f'# SLOW QUERY plan: {stages}')
+
     # 고민중이니 주석처리
     # def delete(self, id:str) -> bool:
     #     """ id가 일치하는 document를 삭제한다. """
@@ -124,7 +503,31 @@ class MongodbController:
         
     #     return True
 
+    @instrument('aggregate', 'pipeline')
     def aggregate_pipline(self, collection:str, pipeline:list):
         coll = self.get_collection(collection)
 
-        return list(coll.aggregate(pipeline))
\ No newline at end of file
+        return list(coll.aggregate(pipeline))
+
+
+class AsyncMongodbController:
+    """ MongodbController와 같은 메소드를 async로 제공하는 클래스
+
+        pymongo 호출은 threadpool에서 실행되므로 handler에서 await 하는 동안 event loop(websocket 포함)가 멈추지 않는다.
+        (Motor 역시 내부적으로 pymongo 호출을 thread executor에서 실행하는 방식이다.)
+    """
+
+    def __init__(self, DB:str) -> None:
+        self.controller = MongodbController(DB)
+
+    def __getattr__(self, name:str):
+        method = getattr(self.controller, name)
+        if not callable(method):
+            return method
+
+        async def wrapper(*args, **kwargs):
+            return await run_in_threadpool(method, *args, **kwargs)
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
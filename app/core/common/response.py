@@ -0,0 +1,23 @@
+import orjson
+from bson.objectid import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def default(obj):
+    """ orjson이 직접 직렬화하지 못하는 타입을 변환한다. """
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError
+
+
+class FastJSONResponse(JSONResponse):
+    """ orjson으로 직렬화하는 JSONResponse
+
+        handler가 이 Response를 직접 반환하면 FastAPI의 jsonable_encoder를 거치지 않고
+        document(ObjectId, tz가 적용된 datetime 포함)를 그대로 JSON bytes로 변환한다.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
@@ -1,56 +1,314 @@
 import os
-import boto3
 import uuid
 import json
+import orjson
+import gzip
+import bisect
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from botocore.exceptions import ClientError
+from fastapi.concurrency import run_in_threadpool
 from core.error.exception import CustomException
+from core.common.cache import LRUCache, DiskCache
+from core.common.response import default
+from core.common.storage_backend import get_backend, get_client, close_client
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# JSON upload 직렬화 옵션 (dict의 int key 허용, numpy 배열/값은 list/숫자로 변환)
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def loads(data:bytes):
+    ''' JSON bytes를 parse한다. orjson이 거부하는 NaN, Infinity가 포함된 object
+        (이전에 json.dumps로 저장한 report, 분석 서버가 만든 aoi report 등)는 json.loads로 읽는다. '''
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+class Compression:
+    """ JSON upload 시 사용할 압축 방식 (gzip, zstd, none)
+
+        - S3_COMPRESSION: 압축 방식 (zstd는 zstandard package가 설치된 경우에만 사용하며, 없으면 gzip을 사용한다)
+        - S3_COMPRESSION_EXCLUDE_PREFIXES: 압축하지 않을 key prefix 목록 (설정하지 않으면 default_exclude())
+        압축된 object에는 ContentEncoding(gzip, zstd)이 기록되고, 읽을 때는 header 또는 magic bytes로 판별한다.
+    """
+
+    def __init__(self) -> None:
+        load_dotenv()
+        self.method = os.environ.get('S3_COMPRESSION', 'gzip').lower()
+        if self.method == 'zstd' and zstandard is None:
+            print('ERROR zstandard is not installed, S3_COMPRESSION=gzip is used instead')
+            self.method = 'gzip'
+        self.exclude = [p for p in os.environ.get('S3_COMPRESSION_EXCLUDE_PREFIXES', self.default_exclude()).split(',') if p]
+
+    @staticmethod
+    def default_exclude() -> str:
+        """ 외부 분석 서버(ANALYSIS_BASE_URL)는 raw gaze(exhibition/gaze, test 계정은 SYSYSY)와 fixation을 S3에서 직접 읽는데,
+            압축된 object를 읽지 못한다. 따라서 분석 서버를 사용하는 동안은 해당 prefix의 압축이 꺼져 있고
+            (서버가 압축을 지원하면 S3_COMPRESSION_EXCLUDE_PREFIXES로 켠다), 분석 서버 없이 FIXATION_MODE=local로 운영하면 모두 압축한다.
+        """
+        if os.environ.get('ANALYSIS_BASE_URL'):
+            return 'exhibition/gaze/,exhibition/fixation/,SYSYSY/'
+        return ''
+
+    def encode(self, key:str, data:bytes) -> tuple[bytes, str | None]:
+        """ key에 맞는 방식으로 data를 압축하고 (압축된 data, ContentEncoding)을 반환한다. """
+        if self.method not in ('gzip', 'zstd') or any(key.startswith(prefix) for prefix in self.exclude):
+            return data, None
+        if self.method == 'zstd':
+            return zstandard.ZstdCompressor(level=3).compress(data), 'zstd'
+        return gzip.compress(data, compresslevel=6), 'gzip'
+
+    @staticmethod
+    def decode(data:bytes, encoding:str = None) -> bytes:
+        """ ContentEncoding 또는 magic bytes로 압축 여부를 판별하여 원본 data를 반환한다. (압축되지 않은 기존 object는 그대로 반환) """
+        if encoding == 'gzip' or data[:2] == GZIP_MAGIC:
+            return gzip.decompress(data)
+        if encoding == 'zstd' or data[:4] == ZSTD_MAGIC:
+            if zstandard is None:
+                raise CustomException(503.62)
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return data
+
+compression = Compression()
+
+
+class JsonCache:
+    """ 한 번 저장된 뒤 변경되지 않는 JSON object(fixation, aoi report, daily report 등)의 cache
+
+        memory(원본 bytes, byte 크기 제한 LRU) -> local disk(원본 bytes) -> S3 순서로 조회한다.
+        memory에도 parse된 object가 아닌 bytes를 두어 S3_CACHE_MEMORY_MB가 실제 사용량을 제한하게 하고, 조회할 때마다 parse한다.
+        - S3_CACHE_PREFIXES: cache할 key prefix 목록 (쉼표로 구분, `*`는 전체, 빈 값이면 사용하지 않음)
+        - S3_CACHE_EXCLUDE_PREFIXES: cache하지 않을 key prefix 목록 (한 번만 읽는 raw gaze 등)
+        - S3_CACHE_MEMORY_MB, S3_CACHE_DIR, S3_CACHE_DISK_MB: 각 단계의 크기와 위치 (S3_CACHE_DIR이 빈 값이면 disk 단계 미사용)
+    """
+
+    def __init__(self) -> None:
+        load_dotenv()
+        self.include = [p for p in os.environ.get('S3_CACHE_PREFIXES', '*').split(',') if p]
+        self.exclude = [p for p in os.environ.get('S3_CACHE_EXCLUDE_PREFIXES', 'exhibition/gaze/,SYSYSY/').split(',') if p]
+
+        self.memory = LRUCache('s3_json_memory', maxsize=100000,
+                               maxbytes=int(float(os.environ.get('S3_CACHE_MEMORY_MB', '64')) * 2**20))
+
+        directory = os.environ.get('S3_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'fie-s3-cache'))
+        self.disk = None
+        # local backend는 object가 이미 local disk에 있으므로 disk 단계를 사용하지 않는다.
+        if directory and os.environ.get('STORAGE_BACKEND', 's3').lower() != 'local':
+            self.disk = DiskCache('s3_json_disk', directory, int(float(os.environ.get('S3_CACHE_DISK_MB', '1024')) * 2**20))
+
+    def enabled(self, key:str) -> bool:
+        if any(key.startswith(prefix) for prefix in self.exclude):
+            return False
+        return any(prefix == '*' or key.startswith(prefix) for prefix in self.include)
+
+    def get_memory(self, name:str):
+        """ memory에 cache된 bytes를 parse하여 반환한다. 없으면 LRUCache.MISSING을 반환한다. """
+        body = self.memory.get(name, LRUCache.MISSING)
+        if body is LRUCache.MISSING:
+            return body
+        return loads(body)
+
+    def get_disk(self, name:str):
+        """ disk에 cache된 bytes를 memory에 올리고 parse하여 반환한다. 없으면 LRUCache.MISSING을 반환한다. """
+        if self.disk is None:
+            return LRUCache.MISSING
+
+        body = self.disk.get(name)
+        if body is None:
+            return LRUCache.MISSING
+
+        self.memory.set(name, body, size=len(body))
+        return loads(body)
+
+    def set(self, name:str, body:bytes):
+        """ S3에서 받은 원본 bytes를 memory, disk에 저장하고 parse한 object를 반환한다. """
+        value = loads(body)
+        self.memory.set(name, body, size=len(body))
+        if self.disk is not None:
+            try:
+                self.disk.set(name, body)
+            except OSError as e:
+                print(f'ERROR Cannot write s3 disk cache \'{name}\': {e}')
+        return value
+
+    def invalidate(self, name:str) -> None:
+        self.memory.invalidate(name)
+        if self.disk is not None:
+            self.disk.invalidate(name)
+
+json_cache = JsonCache()
+
+# get_json_many에서 동시에 읽어오는 최대 object 수 (S3_MAX_POOL_CONNECTIONS 이하로 설정한다)
+FETCH_CONCURRENCY = int(os.environ.get('S3_FETCH_CONCURRENCY', '16'))
+
+# prefix 별 key 목록 (bucket, prefix) -> 정렬된 key list, 해당 prefix에 upload/delete가 일어나면 삭제된다.
+key_index = LRUCache('s3_key_index', maxsize=64, ttl=float(os.environ.get('S3_LIST_CACHE_TTL', '30')))
+
 
 class Storage:
-    
+    """ bucket에 파일을 저장, 조회, 삭제하는 클래스
+
+        실제 저장 위치는 STORAGE_BACKEND로 선택한 backend(core.common.storage_backend)가 결정한다.
+    """
+
     def __init__(self, bucket_name:str) -> None:
-        load_dotenv()
-        
-        self.s3 = boto3.client(
-            's3',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY'],
-            aws_secret_access_key=os.environ['AWS_SECRET_KEY']
-            )
-        
         self.bucket = bucket_name
-    
+        self.backend = get_backend()
+
     def upload(self, file_data, form:str, path:str, key=None)-> str:
         ''' 주어진 key로 S3에 파일을 저장하는 함수. Key값이 주어지지 않으면 랜덤한 값으로 생성함. '''
         if key is None:
             key = uuid.uuid4()
+        else:
+            json_cache.invalidate(f'{self.bucket}/{path}/{key}.{form}')
         key = path + '/' + str(key) + '.' + form
+        self.invalidate_key_index(key)
 
+        content_type, encoding = None, None
         if form == "json":
-            file_data = json.dumps(file_data)
+            file_data, encoding = compression.encode(key, orjson.dumps(file_data, default=default, option=JSON_OPTIONS))
+            content_type = 'application/json'
 
         try:
-            self.s3.put_object(Bucket=self.bucket, Key=key, Body=file_data)
+            self.backend.put(self.bucket, key, file_data, content_type, encoding)
         except ClientError:
             raise CustomException(503.61)
-        
+
         return str(key)
-    
+
     def get_json(self, key:str) -> dict:
-        response = self.s3.get_object(Bucket=self.bucket, Key=key)
-        data = response['Body'].read().decode('utf-8')
-        return json.loads(data)
-        
+        ''' JSON object를 읽어온다. cache 대상 key는 json_cache를 먼저 확인한다.
+            (cache된 object는 여러 요청이 함께 사용하므로 변경하지 않아야 한다) '''
+        if json_cache.enabled(key):
+            value = json_cache.get_memory(f'{self.bucket}/{key}')
+            if value is not LRUCache.MISSING:
+                return value
+        return self.load_json(key)
+
+    def load_json(self, key:str) -> dict:
+        ''' memory cache를 제외하고 disk cache, S3 순서로 JSON object를 읽어온다. '''
+        cacheable = json_cache.enabled(key)
+        if cacheable:
+            value = json_cache.get_disk(f'{self.bucket}/{key}')
+            if value is not LRUCache.MISSING:
+                return value
+
+        data = Compression.decode(*self.backend.get(self.bucket, key))
+        if cacheable:
+            return json_cache.set(f'{self.bucket}/{key}', data)
+        return loads(data)
+
+    def get_json_many(self, keys:list, concurrency:int = None):
+        ''' 여러 key의 JSON object를 최대 concurrency개씩 동시에 읽어오며, 완료되는 순서대로 (key, data, error)를 반환하는 generator
+            한 key의 실패는 error(Exception)로 전달되고 나머지 key의 조회는 계속된다. 같은 key는 한 번만 읽는다. '''
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return
+
+        def fetch(key):
+            try:
+                return key, self.get_json(key), None
+            except Exception as e:
+                return key, None, e
+
+        with ThreadPoolExecutor(max_workers=min(concurrency or FETCH_CONCURRENCY, len(keys))) as executor:
+            futures = [executor.submit(fetch, key) for key in keys]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
     def delete(self, key:str) -> None:
-        self.s3.delete_object(Bucket=self.bucket, Key=key)
-
-    def get_list(self, prefix, extension=None):
-        objects = self.s3.list_objects(Bucket=self.bucket, Prefix=prefix)
-        result = []
-        for content in objects['Contents']:
-            key = content['Key']
-            if extension is None:
-                result.append(key)
-            elif key.endswith('.json'):
-                result.append(key)
-
-        return result
\ No newline at end of file
+        self.backend.delete(self.bucket, key)
+        json_cache.invalidate(f'{self.bucket}/{key}')
+        self.invalidate_key_index(key)
+
+    def iter_keys(self, prefix:str, extension:str = None, start_after:str = None):
+        ''' prefix로 시작하는 key를 사전순으로 모두 반환하는 generator (S3는 1000개 단위 page를 이어서 조회한다) '''
+        suffix = None if extension is None else '.' + extension.lstrip('.')
+        for key in self.backend.iter_keys(self.bucket, prefix, start_after):
+            if suffix is None or key.endswith(suffix):
+                yield key
+
+    def get_list(self, prefix, extension=None, start_after=None):
+        ''' prefix로 시작하는 key 목록을 반환한다. prefix 별 전체 key 목록은 S3_LIST_CACHE_TTL 동안 cache된다.
+            start_after가 주어졌는데 cache가 없으면 S3에 StartAfter로 그 이후의 key만 조회한다. (일부 목록이므로 cache하지 않음) '''
+        keys = key_index.get((self.bucket, prefix))
+        if keys is None and start_after:
+            return list(self.iter_keys(prefix, extension, start_after))
+        if keys is None:
+            keys = list(self.iter_keys(prefix))
+            key_index.set((self.bucket, prefix), keys)
+
+        if start_after:
+            keys = keys[bisect.bisect_right(keys, start_after):]
+        if extension is not None:
+            suffix = '.' + extension.lstrip('.')
+            keys = [key for key in keys if key.endswith(suffix)]
+        return list(keys)
+
+    def invalidate_key_index(self, key:str) -> None:
+        ''' key가 포함되는 prefix의 key 목록 cache를 삭제한다. '''
+        key_index.invalidate_where(lambda k: k[0] == self.bucket and key.startswith(k[1]))
+
+
+class AsyncStorage:
+    """ Storage와 같은 메소드를 async로 제공하는 클래스
+
+        backend 호출(boto3, 파일 입출력)은 threadpool에서 실행되므로 handler에서 await 하는 동안 event loop가 멈추지 않는다.
+        (AsyncMongodbController와 같은 방식)
+    """
+
+    def __init__(self, bucket_name:str) -> None:
+        self.storage = Storage(bucket_name)
+
+    async def get_json(self, key:str) -> dict:
+        """ memory cache에 있으면 threadpool을 거치지 않고 바로 반환한다. """
+        if json_cache.enabled(key):
+            value = json_cache.get_memory(f'{self.storage.bucket}/{key}')
+            if value is not LRUCache.MISSING:
+                return value
+        return await run_in_threadpool(self.storage.load_json, key)
+
+    async def get_json_many(self, keys:list, concurrency:int = None):
+        """ Storage.get_json_many의 async generator 버전 (async for key, data, error in storage.get_json_many(keys)) """
+        semaphore = asyncio.Semaphore(concurrency or FETCH_CONCURRENCY)
+
+        async def fetch(key):
+            async with semaphore:
+                try:
+                    return key, await self.get_json(key), None
+                except Exception as e:
+                    return key, None, e
+
+        tasks = [asyncio.ensure_future(fetch(key)) for key in dict.fromkeys(keys)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def __getattr__(self, name:str):
+        method = getattr(self.storage, name)
+        if not callable(method):
+            return method
+
+        async def wrapper(*args, **kwargs):
+            return await run_in_threadpool(method, *args, **kwargs)
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
@@ -0,0 +1,171 @@
+"""
+Storage backend
+
+    Storage(core.common.s3)가 object를 실제로 저장하는 위치. STORAGE_BACKEND 환경변수로 선택한다.
+    - s3    : AWS S3 (또는 S3_ENDPOINT_URL의 S3 호환 storage)
+    - local : STORAGE_LOCAL_DIR 아래에 <bucket>/<key> 경로로 저장하는 local disk (offline 테스트, 단일 서버 배포용)
+
+    모든 backend는 같은 동작을 보장한다.
+    - get: 없는 key는 ClientError(NoSuchKey)를 발생시킨다.
+    - delete: 없는 key를 삭제해도 오류가 발생하지 않는다.
+    - iter_keys: prefix로 시작하는 key를 사전순으로 반환한다.
+"""
+
+import os
+import uuid
+import boto3
+import threading
+from dotenv import load_dotenv
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """ 프로세스 전체에서 공유하는 S3 client(connection pool)를 반환한다. 최초 호출 시에 생성한다.
+
+        - S3_MAX_POOL_CONNECTIONS: 동시에 사용할 수 있는 connection 수 (threadpool 크기에 맞춘다)
+        - S3_ENDPOINT_URL: 설정하면 해당 주소의 S3 호환 storage(moto server, MinIO 등)를 사용한다.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                load_dotenv()
+                _client = boto3.client(
+                    's3',
+                    aws_access_key_id=os.environ['AWS_ACCESS_KEY'],
+                    aws_secret_access_key=os.environ['AWS_SECRET_KEY'],
+                    endpoint_url=os.environ.get('S3_ENDPOINT_URL') or None,
+                    config=Config(max_pool_connections=int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '40')))
+                    )
+    return _client
+
+def close_client() -> None:
+    """ 공유 S3 client를 닫는다. (app shutdown 시 호출) """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+class S3Backend:
+    """ 공유 S3 client를 사용하는 backend """
+
+    name = 's3'
+
+    def put(self, bucket:str, key:str, body:bytes, content_type:str = None, content_encoding:str = None) -> None:
+        options = {}
+        if content_type is not None:
+            options['ContentType'] = content_type
+        if content_encoding is not None:
+            options['ContentEncoding'] = content_encoding
+        get_client().put_object(Bucket=bucket, Key=key, Body=body, **options)
+
+    def get(self, bucket:str, key:str) -> tuple[bytes, str | None]:
+        """ (body, ContentEncoding)을 반환한다. """
+        response = get_client().get_object(Bucket=bucket, Key=key)
+        return response['Body'].read(), response.get('ContentEncoding')
+
+    def delete(self, bucket:str, key:str) -> None:
+        get_client().delete_object(Bucket=bucket, Key=key)
+
+    def iter_keys(self, bucket:str, prefix:str, start_after:str = None):
+        """ list_objects_v2의 1000개 단위 page를 continuation token으로 이어서 조회한다. """
+        params = {'Bucket': bucket, 'Prefix': prefix}
+        if start_after:
+            params['StartAfter'] = start_after
+
+        while True:
+            response = get_client().list_objects_v2(**params)
+            for content in response.get('Contents', []):
+                yield content['Key']
+
+            if not response.get('IsTruncated'):
+                break
+            params['ContinuationToken'] = response['NextContinuationToken']
+
+
+class LocalBackend:
+    """ STORAGE_LOCAL_DIR/<bucket>/<key> 경로에 object를 저장하는 backend
+
+        파일은 같은 디렉토리의 임시 파일에 쓴 뒤 os.replace로 교체하므로 읽는 쪽에서 쓰다 만 파일을 볼 수 없다.
+        압축 여부는 파일 내용(magic bytes)으로 판별하므로 ContentEncoding은 따로 저장하지 않는다.
+    """
+
+    name = 'local'
+    TMP_SUFFIX = '.tmp'
+
+    def __init__(self, root:str) -> None:
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, bucket:str, key:str) -> str:
+        base = os.path.join(self.root, bucket)
+        path = os.path.normpath(os.path.join(base, key))
+        if not key or os.path.commonpath([base, path]) != base or key.endswith(self.TMP_SUFFIX):
+            raise ClientError({'Error': {'Code': 'InvalidArgument', 'Message': f'Invalid key: {key}'}}, 'LocalBackend')
+        return path
+
+    def put(self, bucket:str, key:str, body:bytes, content_type:str = None, content_encoding:str = None) -> None:
+        path = self.path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        tmp = f'{path}.{uuid.uuid4().hex}{self.TMP_SUFFIX}'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, path)
+        except OSError as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise ClientError({'Error': {'Code': 'InternalError', 'Message': str(e)}}, 'PutObject')
+
+    def get(self, bucket:str, key:str) -> tuple[bytes, str | None]:
+        try:
+            with open(self.path(bucket, key), 'rb') as f:
+                return f.read(), None
+        except (FileNotFoundError, IsADirectoryError):
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': f'The specified key does not exist: {key}'}}, 'GetObject')
+
+    def delete(self, bucket:str, key:str) -> None:
+        try:
+            os.remove(self.path(bucket, key))
+        except FileNotFoundError:
+            pass
+
+    def iter_keys(self, bucket:str, prefix:str, start_after:str = None):
+        """ prefix가 가리키는 디렉토리 아래의 파일만 탐색하여 key를 사전순으로 반환한다. """
+        base = os.path.join(self.root, bucket)
+        directory = os.path.join(base, os.path.dirname(prefix))
+        if os.path.commonpath([base, os.path.normpath(directory)]) != base:
+            return
+
+        keys = []
+        for current, _, files in os.walk(directory):
+            for file in files:
+                if file.endswith(self.TMP_SUFFIX):
+                    continue
+                key = os.path.relpath(os.path.join(current, file), base).replace(os.sep, '/')
+                if key.startswith(prefix) and (not start_after or key > start_after):
+                    keys.append(key)
+
+        yield from sorted(keys)
+
+
+_backend = None
+
+def get_backend():
+    """ STORAGE_BACKEND(s3, local) 설정에 맞는 backend를 반환한다. """
+    global _backend
+    if _backend is None:
+        load_dotenv()
+        if os.environ.get('STORAGE_BACKEND', 's3').lower() == 'local':
+            _backend = LocalBackend(os.environ.get('STORAGE_LOCAL_DIR', 'storage'))
+        else:
+            _backend = S3Backend()
+    return _backend
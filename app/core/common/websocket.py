@@ -2,14 +2,14 @@
 WebSocket
 """
 
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from v2.routers.src.util import Util
 from fastapi import WebSocket, WebSocketDisconnect
 import json
 
 import asyncio
 
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 
 class ConnectionManager:
     """ 연결된 Web, App Websocket들을 관리하는 클래스
@@ -44,7 +44,7 @@ class ConnectionManager:
 
         await self.check_connections(s_id, h_id)
         if s_id != None and h_id == None:
-            if check_client_in_db('store', s_id) == False:
+            if await check_client_in_db('store', s_id) == False:
                 await self.send_client_data(websocket, failed_data)
                 raise WebSocketDisconnect(f'The ID is not exist.')
             
@@ -52,17 +52,16 @@ class ConnectionManager:
             await self.send_client_data(websocket, connected_data)
     
         elif  h_id != None and s_id == None:
-            if check_client_in_db('history', h_id) == False:
+            if await check_client_in_db('history', h_id) == False:
                 await self.send_client_data(websocket, failed_data)
                 raise WebSocketDisconnect(f'The ID is not exist.')
             
             _id = Util.check_id(h_id)
             order_dict = {}
-            history = DB.read_one('history', {'_id': _id})
+            history = await DB.read_one('history', {'_id': _id})
             
-            for o_id in history['orders']:
-                _id = Util.check_id(o_id)
-                order = DB.read_one('order', {'_id': _id})
+            orders = await DB.read_many_by_ids('order', history['orders'], {'s_id': 1})
+            for o_id, order in zip(history['orders'], orders):
                 order_dict[o_id] = order['s_id']
 
             self.app_connections[h_id] = {
@@ -117,9 +116,9 @@ class ConnectionManager:
                 if h_id:
                     # user의 현재 진행중인 주문 항목 삭제
                     _id = Util.check_id(h_id)
-                    history = DB.read_one('history', {'_id', _id})
+                    history = await DB.read_one('history', {'_id', _id})
                     _id = Util.check_id(history['u_id'])
-                    DB.update_one('user', {'_id':_id}, {'h_id':""})
+                    await DB.update_one('user', {'_id':_id}, {'h_id':""})
             
                 await self.disconnect(websocket, s_id, h_id)
                 raise WebSocketDisconnect(f'The client requested to close the connection.')
@@ -225,9 +224,9 @@ class ConnectionManager:
             print(f'ERROR Cannot create_order \'all web client is not connected\'')
 
     
-    async def send_update(self, o_id : str):
+    async def send_update(self, o_id : str, status : int = None):
         """ (PUT order) web이 변경한 상태를 app에게 알린다.
-            - input : o_id
+            - input : o_id, status (변경된 상태를 이미 알고 있으면 전달하여 DB 조회를 생략)
             - 전송 성공 
                 - app : {"type": "update_status", "result": "success", "o_id" : o_id, "status" : int}
                 - web : {"type": "update_status", "result": "success"}
@@ -240,8 +239,9 @@ class ConnectionManager:
         _id = Util.check_id(o_id)
 
         if app_client:
-            response = DB.read_one('order', {'_id': _id})
-            status = response['status']
+            if status is None:
+                response = await DB.read_one('order', {'_id': _id})
+                status = response['status']
             if status < 3:
                 result['status'] = status
                 await self.send_client_data(app_client, result)
@@ -259,7 +259,7 @@ class ConnectionManager:
         _id = Util.check_id(h_id)
 
         result = {"type": "request", "result": "gaze_omission"}
-        history = DB.read_one('history', {'_id': _id})
+        history = await DB.read_one('history', {'_id': _id})
         
         if history['raw_gaze_path'] == None:
             while self.app_connections[h_id]['gaze'] != True:
@@ -273,11 +273,11 @@ class ConnectionManager:
 
 
 
-def check_client_in_db(db:str, id:str):
+async def check_client_in_db(db:str, id:str):
     id = Util.check_id(id)
 
     try:
-        if DB.read_one(db, {'_id': id}):
+        if await DB.read_one(db, {'_id': id}):
             return True
     except Exception:
         pass
@@ -42,6 +42,10 @@ class APIException(Exception):
         # .6 : Token  ERROR
         422.61 : "A_Token mismatch.",
         422.62 : "R_Token mismatch.",
+        # .7 : order_router ERROR
+        422.71 : "Invalid packed gaze data.",
+        422.72 : "Gaze stream is too large.",
+        422.73 : "Gaze stream is already finalized.",
 
         503.0 : "Service unavailable",
         # .5 : MongDB ERROR
@@ -54,6 +58,7 @@ class APIException(Exception):
         503.57 : "Modified_count is not 1.",
         # .6 : S3 ERROR
         503.61 : "Failed to UPLOAD to S3.",
+        503.62 : "Failed to DECODE S3 object.",
         # .7 : utill ERROR
         503.71 : "The id format is not valid. Please check"
     }
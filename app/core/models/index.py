@@ -0,0 +1,72 @@
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+SAMPLE_DATE = datetime(2023, 9, 12)
+
+# collection 별로 보장해야 하는 index 목록 (app 시작 시 core.common.index.ensure_indexes 로 생성)
+INDEXES = {
+    'order': [
+        IndexModel([('s_id', ASCENDING), ('date', DESCENDING)], name='s_id_date'),
+        IndexModel([('date', ASCENDING)], name='date'),
+    ],
+    'history': [
+        IndexModel([('u_id', ASCENDING), ('date', DESCENDING)], name='u_id_date'),
+        IndexModel([('date', ASCENDING)], name='date'),
+    ],
+    'user': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+    ],
+    'store': [
+        IndexModel([('num', ASCENDING)], name='num'),
+        IndexModel([('name', ASCENDING)], name='name_unique', unique=True),
+    ],
+    'menu': [
+        IndexModel([('s_id', ASCENDING)], name='s_id'),
+    ],
+    'food': [
+        IndexModel([('s_id', ASCENDING), ('num', ASCENDING)], name='s_id_num'),
+    ],
+    'daily': [
+        IndexModel([('date', ASCENDING)], name='date'),
+    ],
+    'temp': [
+        IndexModel([('date', DESCENDING)], name='date'),
+    ],
+}
+
+# collection 별로 선언된 index로 대체되어 ensure_indexes에서 지울 이전 index 이름
+# - user.id: 중복 가입 방지를 위해 non-unique 'id' index를 unique 'id_unique'로 대체
+SUPERSEDED_INDEXES = {
+    'user': ['id'],
+}
+
+# index 점검 시 explain() 으로 실행 계획을 확인할 대표 query 목록
+HOT_QUERIES = {
+    'order': [
+        {'name': '/orders/store/date', 'filter': {'s_id': '', 'date': {'$gte': SAMPLE_DATE, '$lt': SAMPLE_DATE}}, 'sort': [('date', DESCENDING), ('_id', DESCENDING)]},
+        {'name': '/orders/store/dates', 'filter': {'s_id': ''}},
+    ],
+    'history': [
+        {'name': '/orders/historys', 'filter': {'u_id': ''}, 'sort': [('date', DESCENDING), ('_id', DESCENDING)]},
+        {'name': '/exhibition/historys', 'filter': {'date': {'$gte': SAMPLE_DATE, '$lt': SAMPLE_DATE}}},
+    ],
+    'user': [
+        {'name': 'login, idcheck', 'filter': {'id': ''}},
+    ],
+    'store': [
+        {'name': '/stores/namecheck', 'filter': {'name': ''}},
+    ],
+    'food': [
+        {'name': '/foods/q', 'filter': {'s_id': ''}},
+        {'name': '/exhibition/info', 'filter': {'s_id': '', 'num': 0}},
+    ],
+    'menu': [
+        {'name': '/menus/q', 'filter': {'s_id': ''}},
+    ],
+    'daily': [
+        {'name': '/orders/report', 'filter': {'date': SAMPLE_DATE}},
+    ],
+    'temp': [
+        {'name': 'Meta.get_meta', 'filter': {'date': {'$gte': SAMPLE_DATE, '$lt': SAMPLE_DATE}}, 'sort': [('date', ASCENDING), ('_id', ASCENDING)]},
+    ],
+}
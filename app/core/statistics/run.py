@@ -4,13 +4,13 @@ from dotenv import load_dotenv
 import os
 import httpx
 
-from core.common.mongo import MongodbController
-from core.common.s3 import Storage
+from core.common.mongo import AsyncMongodbController
+from core.common.s3 import AsyncStorage
 from .src import DataLoader
 from v2.routers.src.util import Util
 
-DB = MongodbController('FIE_DB2')
-storage = Storage('foodineye2')
+DB = AsyncMongodbController('FIE_DB2')
+storage = AsyncStorage('foodineye2')
 
 class CallAnalysis:
     @staticmethod
@@ -31,11 +31,11 @@ class CallAnalysis:
             'date':{"$gte": yesterday, "$lte": today}
             }
         # orders = DB.read_all_by_query('order', query)
-        orders = DataLoader.get_orders(query)
+        orders = await DataLoader.get_orders(query)
 
         # s_num table, f_num table 불러옴 (각 _id 와 num이 매칭되어있음)
-        s_table = DataLoader.get_store_table()
-        f_table = DataLoader.get_food_table()
+        s_table = await DataLoader.get_store_table()
+        f_table = await DataLoader.get_food_table()
 
         anlz_sale_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/sale/execute"
         headers = {"Content-Type": "application/json"}
@@ -60,7 +60,7 @@ class CallAnalysis:
             'date':{"$gte": yesterday, "$lte": today},
             'aoi_analysis':{"$ne":None}
             }
-        aoi_datas = DataLoader.get_aoi_reports(query)
+        aoi_datas = await DataLoader.get_aoi_reports(query)
 
         aoi_daily_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/aoi/daily"
         headers = {"Content-Type": "application/json"}
@@ -90,12 +90,12 @@ class CallAnalysis:
                 'sale_summary': sale_report[store],
                 'aoi_summary': aoi_report[store]
             }
-            key = str(storage.upload(report_data, "json", "exhibition/daily"))
+            key = str(await storage.upload(report_data, "json", "exhibition/daily"))
 
             result[store] = key
 
         try:
-            object_id = DB.insert_one('daily', result)
+            object_id = await DB.insert_one('daily', result)
             return str(object_id)
 
         except Exception as e:
@@ -122,10 +122,10 @@ class CallAnalysis:
         ]
 
         # 모든 데이터를 이용하여 하루에 대한 report 생성
-        orders = DataLoader.get_orders_oneday(pipeline)
+        orders = await DataLoader.get_orders_oneday(pipeline)
 
-        s_table = DataLoader.get_store_table()
-        f_table = DataLoader.get_food_table()
+        s_table = await DataLoader.get_store_table()
+        f_table = await DataLoader.get_food_table()
 
         anlz_sale_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/sale/execute"
         headers = {"Content-Type": "application/json"}
@@ -151,7 +151,7 @@ class CallAnalysis:
         ]
 
         # 모든 데이터를 이용하여 하루에 대한 report 생성
-        aoi_datas = DataLoader.get_aoi_reports_oneday(pipeline)
+        aoi_datas = await DataLoader.get_aoi_reports_oneday(pipeline)
         
         aoi_daily_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/aoi/daily"
         headers = {"Content-Type": "application/json"}
@@ -186,12 +186,12 @@ class CallAnalysis:
                 'sale_summary': sale_report[store],
                 'aoi_summary': aoi_report[store]
             }
-            key = str(storage.upload(report_data, "json", "exhibition/daily"))
+            key = str(await storage.upload(report_data, "json", "exhibition/daily"))
 
             result[store] = key
 
         try:
-            object_id = DB.insert_one('daily', result)
+            object_id = await DB.insert_one('daily', result)
             return str(object_id)
 
         except Exception as e:
@@ -218,10 +218,10 @@ class CallAnalysis:
         ]
 
         # 하루에 대한 report 생성
-        orders = DataLoader.get_orders(pipeline)
+        orders = await DataLoader.get_orders(pipeline)
 
-        s_table = DataLoader.get_store_table()
-        f_table = DataLoader.get_food_table()
+        s_table = await DataLoader.get_store_table()
+        f_table = await DataLoader.get_food_table()
 
         anlz_sale_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/sale/execute"
         headers = {"Content-Type": "application/json"}
@@ -247,7 +247,7 @@ class CallAnalysis:
         ]
 
         # 하루에 대한 report 생성
-        aoi_datas = DataLoader.get_aoi_reports(pipeline)
+        aoi_datas = await DataLoader.get_aoi_reports(pipeline)
         
         aoi_daily_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/aoi/daily"
         headers = {"Content-Type": "application/json"}
@@ -281,12 +281,12 @@ class CallAnalysis:
                 'sale_summary': sale_report[store],
                 'aoi_summary': aoi_report[store]
             }
-            key = str(storage.upload(report_data, "json", "exhibition/daily"))
+            key = str(await storage.upload(report_data, "json", "exhibition/daily"))
 
             result[store] = key
 
         try:
-            object_id = DB.insert_one('daily', result)
+            object_id = await DB.insert_one('daily', result)
             return str(object_id)
 
         except Exception as e:
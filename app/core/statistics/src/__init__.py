@@ -1 +1,2 @@
-from .dataloader import *
\ No newline at end of file
+from .dataloader import *
+from .fixation import FixationFilter
@@ -1,18 +1,18 @@
 
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from core.error.exception import CustomException
 from v2.routers.src.util import Util
 from datetime import timedelta, datetime
 
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 
 class DataLoader:
     
     @staticmethod
-    def get_store_table():
+    async def get_store_table():
         
         try:
-            stores = DB.read_all('store', {}, {'_id': 1, 'num':1})
+            stores = await DB.read_all('store', {}, {'_id': 1, 'num':1})
             result = {}
             for store in stores:
                result[store['_id']] = store['num']
@@ -23,10 +23,10 @@ class DataLoader:
             print(e)
     
     @staticmethod
-    def get_food_table():
+    async def get_food_table():
         
         try:
-            foods = DB.read_all('food', {}, {'_id': 1, 'num':1})
+            foods = await DB.read_all('food', {}, {'_id': 1, 'num':1})
             result = {}
             for food in foods:
                result[food['_id']] = food['num']
@@ -49,9 +49,9 @@ class DataLoader:
 
     #     except CustomException as e:
     #         print(e)
-    def get_orders(pipeline):
+    async def get_orders(pipeline):
         try:
-            orders = DB.aggregate_pipline('order', pipeline)
+            orders = await DB.aggregate_pipline('order', pipeline)
             for order in orders:
                 order['_id'] = str(order['_id'])
                 order['date'] = str(Util.get_local_time(order['date']))
@@ -75,10 +75,10 @@ class DataLoader:
 
     #     except CustomException as e:
     #         print(e)
-    def get_aoi_reports(pipeline):
+    async def get_aoi_reports(pipeline):
         result = []
         try:
-            historys = DB.aggregate_pipline('history', pipeline)
+            historys = await DB.aggregate_pipline('history', pipeline)
             for history in historys:
                 result.append({
                     "date": str(Util.get_local_time(history['date'])),
@@ -90,9 +90,9 @@ class DataLoader:
 
 
 
-    def get_orders_oneday(pipeline):
+    async def get_orders_oneday(pipeline):
         try:
-            orders = DB.aggregate_pipline('order', pipeline)
+            orders = await DB.aggregate_pipline('order', pipeline)
 
             for order in orders:
                 order['_id'] = str(order['_id'])
@@ -105,10 +105,10 @@ class DataLoader:
         except CustomException as e:
             print(e)
 
-    def get_aoi_reports_oneday(pipeline):
+    async def get_aoi_reports_oneday(pipeline):
         result = []
         try:
-            historys = DB.aggregate_pipline('history', pipeline)
+            historys = await DB.aggregate_pipline('history', pipeline)
             for history in historys:
                 history['_id'] = str(history['_id'])
                 hour = Util.get_local_time(history['date']).hour                
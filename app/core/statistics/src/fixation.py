@@ -0,0 +1,82 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class FixationFilter:
+    """ raw gaze에서 fixation을 찾는 I-VT(velocity-threshold) filter
+
+        page 단위로 모든 sample을 NumPy 배열로 한 번에 처리한다.
+        - 연속한 두 sample 사이의 속도(좌표/초)가 FIXATION_VELOCITY_THRESHOLD 미만이고
+          시간 간격이 FIXATION_MAX_GAP(ms) 이하이면 같은 fixation으로 묶는다.
+        - 지속 시간(et - st)이 FIXATION_MIN_DURATION(ms) 미만인 묶음은 버린다.
+        - 좌표가 없는 sample(x, y 누락 또는 -99.9)은 제외하며, 그 구간은 시간 간격으로 처리된다.
+        결과는 외부 filter 서버와 같은 형식 [{page, s_num, f_num, fixations: [{cx, cy, st, et}]}] 이다.
+    """
+    MISSING = -99.9
+
+    VELOCITY_THRESHOLD = float(os.environ.get('FIXATION_VELOCITY_THRESHOLD', '1000'))
+    MIN_DURATION = float(os.environ.get('FIXATION_MIN_DURATION', '100'))
+    MAX_GAP = float(os.environ.get('FIXATION_MAX_GAP', '75'))
+
+    @staticmethod
+    def filter_pages(pages:list) -> list:
+        """ raw gaze page 목록([{page, s_num, f_num, gaze}])의 page 별 fixation 목록을 반환한다. """
+        result = []
+        for page in pages:
+            x, y, t = FixationFilter.to_arrays(page['gaze'])
+            result.append({
+                'page': page['page'],
+                's_num': page['s_num'],
+                'f_num': page['f_num'],
+                'fixations': FixationFilter.detect(x, y, t)
+            })
+        return result
+
+    @staticmethod
+    def to_arrays(gaze:list) -> tuple:
+        n = len(gaze)
+        x = np.fromiter((point.get('x', np.nan) for point in gaze), dtype=np.float64, count=n)
+        y = np.fromiter((point.get('y', np.nan) for point in gaze), dtype=np.float64, count=n)
+        t = np.fromiter((point['t'] for point in gaze), dtype=np.float64, count=n)
+        return x, y, t
+
+    @staticmethod
+    def detect(x:np.ndarray, y:np.ndarray, t:np.ndarray,
+               velocity_threshold:float = None, min_duration:float = None, max_gap:float = None) -> list:
+        """ 한 page의 x, y, t(ms) 배열에서 fixation 목록 [{cx, cy, st, et}]을 찾는다. """
+        velocity_threshold = FixationFilter.VELOCITY_THRESHOLD if velocity_threshold is None else velocity_threshold
+        min_duration = FixationFilter.MIN_DURATION if min_duration is None else min_duration
+        max_gap = FixationFilter.MAX_GAP if max_gap is None else max_gap
+
+        valid = np.isfinite(x) & np.isfinite(y) & (x != FixationFilter.MISSING) & (y != FixationFilter.MISSING)
+        x, y, t = x[valid], y[valid], t[valid]
+        if len(t) == 0:
+            return []
+
+        order = np.argsort(t, kind='stable')
+        x, y, t = x[order], y[order], t[order]
+
+        # 연속한 sample 사이의 속도 (좌표/초), 같은 시각의 sample은 거리가 0일 때만 같은 fixation으로 본다.
+        dt = np.diff(t)
+        distance = np.hypot(np.diff(x), np.diff(y))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            velocity = np.where(dt > 0, distance / (dt / 1000), np.where(distance > 0, np.inf, 0))
+        joined = (velocity < velocity_threshold) & (dt <= max_gap)
+
+        # joined가 끊기는 위치마다 새 fixation이 시작된다.
+        starts = np.flatnonzero(np.r_[True, ~joined])
+        ends = np.r_[starts[1:], len(t)] - 1
+        counts = ends - starts + 1
+
+        cx = np.add.reduceat(x, starts) / counts
+        cy = np.add.reduceat(y, starts) / counts
+        st, et = t[starts], t[ends]
+
+        keep = (et - st) >= min_duration
+        return [
+            {'cx': px, 'cy': py, 'st': s, 'et': e}
+            for px, py, s, e in zip(np.round(cx[keep], 3).tolist(), np.round(cy[keep], 3).tolist(),
+                                    st[keep].astype(np.int64).tolist(), et[keep].astype(np.int64).tolist())
+        ]
@@ -4,12 +4,27 @@ from fastapi.middleware.cors import CORSMiddleware
 import traceback
 
 from core.error.exception import APIException,CustomException
+from core.common.mongo import close_client
+from core.common import s3
+from core.common.index import ensure_indexes
+from core.common.response import FastJSONResponse
+from fastapi.concurrency import run_in_threadpool
 
 from v2.api import v2_router
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 app.include_router(v2_router)
 
+
+@app.on_event("startup")
+async def startup():
+    await run_in_threadpool(ensure_indexes)
+
+@app.on_event("shutdown")
+def shutdown():
+    close_client()
+    s3.close_client()
+
 # from apscheduler.schedulers.background import BackgroundScheduler
 # from datetime import datetime
 # from core.statistics.run import CallAnalysis
@@ -24,13 +24,26 @@ v2_router.include_router(exhibition_router)
 async def hello():
     return {"message": "Hello 'api/v2'"}
 
-from core.common.s3 import Storage
+from fastapi import Depends, Request
+from core.common.metrics import metrics
+from core.common.authority import TokenManagement
+
+TokenManager = TokenManagement()
+
+@v2_router.get("/metrics", include_in_schema=False, dependencies=[Depends(TokenManager.dispatch)])
+async def get_metrics(request:Request):
+    """ process 내부에서 수집한 metric(mongo query 시간 등)을 반환한다. (seller token 필요) """
+    assert TokenManager.is_seller(request.state.token_scope), 403.1
+    return metrics.snapshot()
+
+from core.common.s3 import AsyncStorage
+
+storage = AsyncStorage('foodineye2')
 
 @v2_router.get("/s3/keys")
-async def get_keys(prefix:str='/', extension:str=None):
+async def get_keys(prefix:str='/', extension:str=None, start_after:str=None):
     try:
-        storage = Storage('foodineye2')
-        return storage.get_list(prefix, extension)
+        return await storage.get_list(prefix, extension, start_after)
     
     except:
         return "ERROR"
@@ -39,8 +52,7 @@ async def get_keys(prefix:str='/', extension:str=None):
 @v2_router.get("/s3/keys/gaze")
 async def get_keys(key: str):
     try:
-        storage = Storage('foodineye2')
-        return storage.get_json(key)
+        return await storage.get_json(key)
 
     except:
         return "ERROR"
@@ -54,10 +66,10 @@ async def get_report(date:str):
     new_date = Util.get_utc_time_by_str(date)
     return await CallAnalysis.daily_summary(new_date)
 
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from v2.routers.order import preprocess_and_update
 
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 
 @v2_router.get("/aoi_create")
 async def get_report():
@@ -69,7 +81,7 @@ async def get_report():
         { "$project": { "_id": 1, "fixation_path": 1 }}
     ]
 
-    historys = DB.aggregate_pipline('order', pipeline)
+    historys = await DB.aggregate_pipline('order', pipeline)
     print(historys)
 
 # from datetime import datetime
@@ -104,7 +116,6 @@ async def get_report():
 #         return e
 
 # history내의 모든 시선데이터에 대해서 filter와 aoi 통계를 일괄 적용(설정이 바뀐 경우에 한번에 적용하기에 유리)
-from core.common.mongo import MongodbController
 import os
 from dotenv import load_dotenv
 import httpx
@@ -113,7 +124,6 @@ from .routers.src.meta import Meta
 
 @v2_router.get("/test")
 async def testcode():
-    DB = MongodbController('FIE_DB2')
     try:
         load_dotenv()
 
@@ -121,7 +131,7 @@ async def testcode():
         aoi_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/aoi/analysis"
         headers = {"Content-Type": "application/json"}
        
-        datas = DB.read_all('history', {'date':{"$gte": datetime(2023, 9, 12, 4, 45)} , 'raw_gaze_path':{'$ne': None}}, {'_id':1, 'raw_gaze_path':1})
+        datas = await DB.read_all('history', {'date':{"$gte": datetime(2023, 9, 12, 4, 45)} , 'raw_gaze_path':{'$ne': None}}, {'_id':1, 'raw_gaze_path':1})
         result = []
         for d in datas:
             if 'raw_gaze_path' in d.keys() and d['raw_gaze_path'] != None:
@@ -131,10 +141,10 @@ async def testcode():
 
                 async with httpx.AsyncClient() as client:
                     _id = Util.check_id(h_id)
-                    doc = DB.read_one('history', {'_id':_id})
+                    doc = await DB.read_one('history', {'_id':_id})
                     payload = {
                     "raw_data_key": raw_data_key,
-                    "meta_info": Meta.get_meta_detail(doc['date'])
+                    "meta_info": await Meta.get_meta_detail(doc['date'])
                     }
                     response = await client.post(filter_url, json=payload, headers=headers)
                     data = response.json()
@@ -145,7 +155,7 @@ async def testcode():
                     aoi_key = data["aoi_key"]
                     print(f'fixkey= {fix_key}, aoikey = {aoi_key}')
                 
-                DB.update_one('history', {'_id':_id}, {'fixation_path': fix_key, 'aoi_analysis': aoi_key})
+                await DB.update_one('history', {'_id':_id}, {'fixation_path': fix_key, 'aoi_analysis': aoi_key})
                 result.append({h_id:{'fixation_path': fix_key, 'aoi_analysis': aoi_key}})
         return result
 
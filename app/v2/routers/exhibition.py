@@ -4,9 +4,10 @@ exhibition_router
 
 from fastapi import APIRouter, Depends, Request
 from datetime import timedelta, datetime
-from core.common.mongo import MongodbController
-from core.common.s3 import Storage
+from core.common.mongo import AsyncMongodbController
+from core.common.s3 import AsyncStorage
 from .src.util import Util
+from .src.catalog import Catalog
 from bson.objectid import ObjectId
 import pandas as pd
 import random
@@ -14,11 +15,11 @@ import random
 exhibition_router = APIRouter(prefix="/exhibition")
 
 PREFIX = 'api/v2/exhibition'
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 TODAY_ID = '653d3bbdba45e3b9f51d7b58'
 S_ID_Table = {'64a2d45c1fe80e3e4db82af9':'1', '64a2d49e1fe80e3e4db82afa':'2', '64a2d53f1fe80e3e4db82afb':'3', '64a2d56a1fe80e3e4db82afc':'4', '64a2d58f1fe80e3e4db82afd':'5'}
 
-storage = Storage('foodineye2')
+storage = AsyncStorage('foodineye2')
 
 
 @exhibition_router.get("/hello")
@@ -62,13 +63,13 @@ async def hello():
 
 @exhibition_router.get('/history')
 async def get_history(h_id:str):
-    data = DB.read_one('exhibition', {'_id':ObjectId(TODAY_ID)})
+    data = await DB.read_one('exhibition', {'_id':ObjectId(TODAY_ID)})
     LEFT = get_status(data)
-    RIGHT = get_detail(h_id)
+    RIGHT = await get_detail(h_id)
 
     _id = Util.check_id(h_id)
-    h_data = DB.read_one('history', {'_id':_id})
-    personal = get_personal(h_data['aoi_analysis'])
+    h_data = await DB.read_one('history', {'_id':_id})
+    personal = await get_personal(h_data['aoi_analysis'])
     
     return {'left': LEFT, 'right': RIGHT, 'fix_key': h_data['fixation_path'], 'personal': personal}
 
@@ -82,18 +83,18 @@ async def get_todat_history():
         { "$project": { "_id":1, "date":1, "fixation_path":1 }} 
     ]
 
-    historys = DB.aggregate_pipline('history', pipeline)
+    historys = await DB.aggregate_pipline('history', pipeline)
 
     result = []
     for history in historys:
-        date = Util.get_local_time(history['date']).strftime("%Y-%m-%d %H:%M:%S")
+        date = history['date'].strftime("%Y-%m-%d %H:%M:%S")
         h_id = str(history['_id'])
         result.append({date:h_id})
     return result
 
 @exhibition_router.get("/visualize")
 async def get_fixation_data(fix_key:str):
-    fix_data = storage.get_json(fix_key)
+    fix_data = await storage.get_json(fix_key)
     result = []
     
     for page in fix_data:
@@ -116,7 +117,7 @@ async def get_fixation_data(fix_key:str):
 @exhibition_router.get("/info")
 async def get_food(s_num:int, f_num:int):
     s_id = find_key_by_value(s_num)
-    food = DB.read_one('food', {'num':f_num, 's_id':s_id})
+    food = await Catalog.get(('exhibition_food', s_num, f_num), lambda: DB.read_one('food', {'num':f_num, 's_id':s_id}))
     return food['name']
         
 def find_key_by_value(value):
@@ -163,23 +164,22 @@ def get_status(data):
     }
     
 
-def update_data(data, h_id):
+async def update_data(data, h_id):
     _id = Util.check_id(h_id)
-    h_data = DB.read_one('history', {'_id':_id})
+    h_data = await DB.read_one('history', {'_id':_id})
     
-    for o_id in h_data['orders']:
-        _id = Util.check_id(o_id)
-        o_data = DB.read_one('order', {'_id':_id})
-        for food in o_data['f_list']:
-            _id = Util.check_id(food['f_id'])
-            f_data = DB.read_one('food', {'_id':_id})
-            S_NUM = S_ID_Table[f_data['s_id']]
-            F_NUM = f_data['num']
-            COUNT = food['count']
-
-            data['stores'][S_NUM]['count'][F_NUM] += COUNT
+    orders = await DB.read_many_by_ids('order', h_data['orders'], {'f_list':1})
+    ordered_foods = [food for o_data in orders for food in o_data['f_list']]
+    f_datas = await DB.read_many_by_ids('food', [food['f_id'] for food in ordered_foods], {'s_id':1, 'num':1})
+
+    for food, f_data in zip(ordered_foods, f_datas):
+        S_NUM = S_ID_Table[f_data['s_id']]
+        F_NUM = f_data['num']
+        COUNT = food['count']
+
+        data['stores'][S_NUM]['count'][F_NUM] += COUNT
         
-    aoi_report = storage.get_json(h_data['aoi_analysis'])
+    aoi_report = await storage.get_json(h_data['aoi_analysis'])
     for store, s_value in aoi_report.items():
         S_NUM = store[6:]
         for food, f_value  in s_value['food_report'].items():
@@ -193,15 +193,14 @@ def update_data(data, h_id):
         
     return data
             
-def get_detail(id):
+async def get_detail(id):
     _id = Util.check_id(id)     
 
-    history = DB.read_one('history', {'_id':_id})
+    history = await DB.read_one('history', {'_id':_id})
 
     order_list = []
-    for o_id in history['orders']:
-        _id = Util.check_id(o_id)  
-        order = DB.read_one('order', {'_id':_id})
+    orders = await DB.read_many_by_ids('order', history['orders'], {'s_name':1, 'f_list':1})
+    for order in orders:
         s_name = order['s_name']
         for f in order['f_list']:
             if 'f_name' in f.keys(): f_name = f['f_name']
@@ -214,12 +213,12 @@ def get_detail(id):
             })
     
     return {
-        'date': Util.get_local_time(history['date']),
+        'date': history['date'],
         'order_list': order_list
     }
 
-def get_gazeflow(fix_key):
-    fix_data = storage.get_json(fix_key)
+async def get_gazeflow(fix_key):
+    fix_data = await storage.get_json(fix_key)
     result = []
     
     for page in fix_data:
@@ -239,8 +238,8 @@ def get_gazeflow(fix_key):
         
     return result
 
-def get_personal(aoi_key):
-    aoi_data = storage.get_json(aoi_key)
+async def get_personal(aoi_key):
+    aoi_data = await storage.get_json(aoi_key)
     total = {}
     for store, s_value in aoi_data.items():
         S_NUM = store[6:]
@@ -255,10 +254,10 @@ def get_personal(aoi_key):
     sorted_data = sorted(total.items(), key=lambda x: x[1], reverse=True)
     return sorted_data[:3]
 
-def update_new_history2(h_id:str):
-    data = DB.read_one('exhibition', {'_id':ObjectId(TODAY_ID)})
+async def update_new_history2(h_id:str):
+    data = await DB.read_one('exhibition', {'_id':ObjectId(TODAY_ID)})
     del data['_id']
 
-    updated_data = update_data(data, h_id)
+    updated_data = await update_data(data, h_id)
 
-    DB.replace_one('exhibition', {'_id':ObjectId(TODAY_ID)}, updated_data)
\ No newline at end of file
+    await DB.replace_one('exhibition', {'_id':ObjectId(TODAY_ID)}, updated_data)
\ No newline at end of file
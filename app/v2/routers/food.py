@@ -6,11 +6,12 @@ from PIL import Image
 
 from fastapi import APIRouter, UploadFile, Depends, Request
 from core.models.store import FoodModel
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from core.error.exception import CustomException
 from core.common.authority import TokenManagement
-from core.common.s3 import Storage
+from core.common.s3 import AsyncStorage
 from .src.util import Util
+from .src.catalog import Catalog
 
 
 TokenManager = TokenManagement()
@@ -18,8 +19,8 @@ TokenManager = TokenManagement()
 food_router = APIRouter(prefix="/foods", dependencies=[Depends(TokenManager.dispatch)])
 
 PREFIX = 'api/v2/foods'
-DB = MongodbController('FIE_DB2')
-storage = Storage('foodineye2')
+DB = AsyncMongodbController('FIE_DB2')
+storage = AsyncStorage('foodineye2')
 
 @food_router.get("/hello")
 async def hello():
@@ -31,7 +32,7 @@ async def read_all_food(s_id:str):
 
     Util.check_id(s_id)
 
-    response = DB.read_all('food', {'s_id': s_id})
+    response = await Catalog.get(('foods', s_id), lambda: DB.read_all('food', {'s_id': s_id}))
 
     return {
         'food_list' : response
@@ -43,7 +44,7 @@ async def read_food(id:str):
 
     _id = Util.check_id(id)
 
-    response = DB.read_one('food', {'_id': _id})
+    response = await Catalog.get(('food', id), lambda: DB.read_one('food', {'_id': _id}))
     
     return response
 
@@ -58,14 +59,15 @@ async def create_food(s_id:str, food:FoodModel, request:Request):
     data['img_key'] = None
 
 
-    food_list = DB.read_all('food', {'s_id': s_id})
+    food_list = await DB.read_all('food', {'s_id': s_id})
     if not food_list:
         data['num'] = 1
     else:
         max_num = max(store['num'] for store in food_list)
         data['num'] = max_num + 1
 
-    id = str(DB.insert_one('food', data))
+    id = str(await DB.insert_one('food', data))
+    Catalog.invalidate_food()
     
     return {
         'document_id': id
@@ -79,8 +81,9 @@ async def update_food(id:str, food:FoodModel, request:Request):
     data = food.dict()
 
     _id = Util.check_id(id)
-    if DB.update_one('food', {'_id':_id}, data) == False:
+    if await DB.update_one('food', {'_id':_id}, data) == False:
         raise CustomException(503.54)
+    Catalog.invalidate_food(id)
 
 
 
@@ -91,10 +94,10 @@ async def update_food_image(id: str, file: UploadFile, request:Request):
 
     _id = Util.check_id(id)
 
-    current = DB.read_one('food', {'_id':_id})
+    current = await DB.read_one('food', {'_id':_id})
 
     if current['img_key'] is not None:
-        storage.delete(current['img_key'])
+        await storage.delete(current['img_key'])
 
     file_content = await file.read()
     
@@ -106,9 +109,10 @@ async def update_food_image(id: str, file: UploadFile, request:Request):
                 im.save(output, format='JPEG')
                 file_content = output.getvalue()
         
-    image_key = storage.upload(file_content, form='jpg', path='images')
+    image_key = await storage.upload(file_content, form='jpg', path='images')
     
-    if DB.update_one('food', {'_id': _id}, {'img_key': image_key}):
+    if await DB.update_one('food', {'_id': _id}, {'img_key': image_key}):
+        Catalog.invalidate_food(id)
         return {
             'img_url': 'https://foodineye2.s3.ap-northeast-2.amazonaws.com/' + image_key
         }
@@ -8,9 +8,10 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, Request
 from core.models.store import MenuModel
 from core.common.authority import TokenManagement
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from .src.util import Util
 from .src.meta import Meta
+from .src.catalog import Catalog
 
 
 TokenManager = TokenManagement()
@@ -19,7 +20,7 @@ menu_router = APIRouter(prefix="/menus", dependencies=[Depends(TokenManager.disp
 
 
 PREFIX = 'api/v2/menus'
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 
 @menu_router.get("/hello")
 async def hello():
@@ -31,10 +32,7 @@ async def read_menus_of_store(s_id:str, request:Request):
     assert TokenManager.is_seller(request.state.token_scope), 403.1
 
     Util.check_id(s_id)
-    response = DB.read_all('menu', {'s_id': s_id}) 
-
-    for menu in response:
-        menu['date'] = Util.get_local_time(menu['date'])
+    response = await DB.read_all('menu', {'s_id': s_id}) 
 
     return {
         'menu_list' : response
@@ -45,13 +43,13 @@ async def read_menu(id:str):
     """ 해당하는 id의 menu 정보를 받아온다. """
 
     _id = Util.check_id(id)
-    response = DB.read_one('menu', {'_id':_id})
+    response = await DB.read_one('menu', {'_id':_id})
     
     return {
         "_id": id,
         "s_id": response['s_id'],
         "s_num": response['s_num'],
-        "date": Util.get_local_time(response['date']),
+        "date": response['date'],
         "f_list" : response['f_list']
     }
 
@@ -63,7 +61,7 @@ async def create_menu(s_id:str, menu:MenuModel, request:Request):
     data = menu.dict()
     
     _id = Util.check_id(s_id)
-    store = DB.read_one('store', {'_id':_id})
+    store = await DB.read_one('store', {'_id':_id})
 
     new_menu = {
         's_id': s_id,
@@ -72,10 +70,11 @@ async def create_menu(s_id:str, menu:MenuModel, request:Request):
         'f_list': data['f_list']
     }
 
-    new_id = str(DB.insert_one('menu', new_menu))
+    new_id = str(await DB.insert_one('menu', new_menu))
 
-    DB.update_one('store', {'_id': _id}, {'m_id': new_id})
-    update_meta(s_id, new_id)
+    await DB.update_one('store', {'_id': _id}, {'m_id': new_id})
+    Catalog.invalidate_store(s_id)
+    await update_meta(s_id, new_id)
 
     return {
         'm_id': new_id
@@ -87,14 +86,17 @@ async def read_menu_with_foods(id:str):
     """ 해당하는 id의 음식 정보를 포함한 메뉴판 정보를 받아온다. """
 
     _id = Util.check_id(id)
-    response = DB.read_one('menu', {'_id':_id})
+
+    return await Catalog.get(('menu_foods', id), lambda: load_menu_with_foods(id, _id))
+
+async def load_menu_with_foods(id:str, _id):
+    response = await DB.read_one('menu', {'_id':_id})
     
     food_ids = [food['f_id'] for food in response['f_list']]
     food_list = []
 
-    for f_id in food_ids:
-        _id = Util.check_id(f_id)
-        food = DB.read_one('food', {'_id': _id})
+    foods = await DB.read_many_by_ids('food', food_ids)
+    for f_id, food in zip(food_ids, foods):
         food_list.append({
             "f_id": f_id,
             "name": food['name'],
@@ -107,19 +109,20 @@ async def read_menu_with_foods(id:str):
         })
     response['f_list'] = food_list
     s_id = Util.check_id(response['s_id'])
-    store = DB.read_one('store', {'_id':s_id})
+    store = await DB.read_one('store', {'_id':s_id})
 
     return {
         "_id": id,
         "s_id": response['s_id'],
         "s_num": store['num'],
         's_name': store['name'],
-        "date": Util.get_local_time(response['date']),
+        "date": response['date'],
         "f_list" : response['f_list']
     }
 
-def update_meta(s_id:str, new_m_id:str):
-    cur = Meta.get_meta()
-    content = cur['content']
+async def update_meta(s_id:str, new_m_id:str):
+    cur = await Meta.get_meta()
+    # timeline에 보관된 버전이 바뀌지 않도록 복사해서 사용한다.
+    content = dict(cur['content'])
     content[s_id] = new_m_id
-    Meta.create(content)
\ No newline at end of file
+    await Meta.create(content)
\ No newline at end of file
@@ -4,12 +4,16 @@ order_router
 
 from fastapi import APIRouter, Depends, Request
 from core.models import OrderModel, RawGazeModel
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from core.error.exception import CustomException
 from core.common.authority import TokenManagement
-from core.common.s3 import Storage
+from core.common.s3 import AsyncStorage
+from core.common.response import FastJSONResponse
 from .src.util import Util
 from .src.meta import Meta
+from .src.gaze import PackedGaze
+from core.statistics.src.fixation import FixationFilter
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
 from v2.routers.exhibition import update_new_history2
@@ -23,6 +27,7 @@ import math
 from datetime import datetime, timedelta
 
 from .websocket import websocket_manager as websocket_manager
+from .websocket import gaze_spool
 
 TokenManager = TokenManagement()
 
@@ -30,9 +35,9 @@ order_router = APIRouter(prefix="/orders", dependencies=[Depends(TokenManager.di
 
 
 PREFIX = 'api/v2/orders'
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 
-storage = Storage('foodineye2')
+storage = AsyncStorage('foodineye2')
 
 @order_router.get("/hello")
 async def hello():
@@ -73,13 +78,11 @@ async def get_order(s_id: str=None, u_id: str=None, today: bool=False, asc_by: s
             q_str = q_str + "&" + str
 
 
-    response = DB.read_all('order', query, asc_by=asc_by, asc=asc)
-    for order in response:
-        order['date'] = Util.get_local_time(order['date'])
+    response = await DB.read_all('order', query, asc_by=asc_by, asc=asc)
     
-    return {
+    return FastJSONResponse({
         'order_list' : response
-    }
+    })
 
 @order_router.get("/order")
 async def get_order(id: str, detail: bool=False):
@@ -88,14 +91,13 @@ async def get_order(id: str, detail: bool=False):
 
     q_str += f"id={id}"
     _id = Util.check_id(id)
-    response = DB.read_one('order', {'_id':_id})
+    response = await DB.read_one('order', {'_id':_id})
     if detail:
         q_str += f"&detail={detail}"
         f_list = response["f_list"]
         new_list = []
-        for dict in f_list:
-            _id = Util.check_id(dict["f_id"])
-            food_detail = DB.read_one("food", {'_id':_id})
+        foods = await DB.read_many_by_ids("food", [dict["f_id"] for dict in f_list], {'name':1, 'price':1})
+        for dict, food_detail in zip(f_list, foods):
             new_list.append({
                 "name": food_detail["name"],
                 "count": dict["count"],
@@ -105,7 +107,7 @@ async def get_order(id: str, detail: bool=False):
     
     return {
         "_id": id,
-        "date": Util.get_local_time(response['date']),
+        "date": response['date'],
         "u_id": response['u_id'],
         "s_id": response['s_id'],
         "m_id": response['m_id'],
@@ -117,11 +119,10 @@ async def get_order(id: str, detail: bool=False):
 @order_router.get("/order/h")
 async def get_order_by_hid(id:str):
     _id = Util.check_id(id)
-    response = DB.read_one('history', {'_id':_id})
+    response = await DB.read_one('history', {'_id':_id})
     result = []
-    for o_id in response["orders"]:
-        _id = Util.check_id(o_id)
-        order = DB.read_one('order', {'_id':_id})
+    orders = await DB.read_many_by_ids('order', response["orders"])
+    for o_id, order in zip(response["orders"], orders):
         result.append({
             'o_id': o_id,
             'status': order['status'],
@@ -134,7 +135,7 @@ async def get_order_by_hid(id:str):
 
 @order_router.get("/history/status")
 async def get_history_status(id:str):
-    return { 'complete': Util.is_done(id)}
+    return { 'complete': await Util.is_done(id)}
 
 @order_router.put("/order/status")
 async def change_status(id: str, request:Request):
@@ -142,19 +143,18 @@ async def change_status(id: str, request:Request):
     assert TokenManager.is_seller(request.state.token_scope), 403.1
 
     _id = Util.check_id(id)
-    response = DB.read_one('order', {'_id':_id})
-    s = response['status']
-    
-    if s < 2:
-        DB.update_one('order', {'_id':_id}, {'status': s+1})
 
-        await websocket_manager.send_update(id)
+    # 완료(2) 전인 주문만 한 번의 요청으로 상태를 올린다. (동시 요청 시에도 한 번만 반영됨)
+    response = await DB.find_one_and_update('order', {'_id':_id, 'status': {'$lt': 2}}, {'$inc': {'status': 1}}, {'status': 1})
 
-    else:
+    if response is None:
+        await DB.read_one('order', {'_id':_id})
         raise CustomException(403.71)
+
+    await websocket_manager.send_update(id, response['status'])
     
     return {
-        'status': {s+1}
+        'status': {response['status']}
     }
 
 
@@ -164,16 +164,17 @@ async def new_order(body:OrderModel, request:Request):
     assert TokenManager.is_buyer(request.state.token_scope), 403.1
     
     response_list = []
-    order_id_list = []
+    order_list = []
     store_name_list = []
 
+    date = Util.get_utc_time()
     total_price = 0           
     for store_order in body.content:
         store_price = 0
         for food in store_order.f_list:
             store_price += food['price'] * food['count']
-        order = {
-            "date": Util.get_utc_time(),
+        order_list.append({
+            "date": date,
             "u_id": body.u_id,
             "s_id": store_order.s_id,
             "m_id": store_order.m_id,
@@ -181,23 +182,25 @@ async def new_order(body:OrderModel, request:Request):
             "f_list": store_order.f_list,
             "total_price": store_price,
             "status": 0
-        }
+        })
 
         total_price += store_price
-
-        o_id =  str(DB.insert_one('order', order))         
-        order_id_list.append(o_id)
         store_name_list.append(store_order.s_name)
+
+    # 가게 수와 관계없이 모든 주문을 한 번의 요청으로 저장한다.
+    order_id_list = [str(o_id) for o_id in await DB.insert_many('order', order_list)]
+
+    for store_order, o_id in zip(body.content, order_id_list):
         response_list.append({
             "s_id": store_order.s_id,
             "o_id": o_id
         })
 
-        await websocket_manager.send_create(store_order.s_id)
+    await asyncio.gather(*[websocket_manager.send_create(store_order.s_id) for store_order in body.content])
 
     history = {
         "u_id": body.u_id,
-        "date": order['date'],
+        "date": date,
         "total_price": total_price,
         "raw_gaze_path": None,
         "fixation_path": None,
@@ -206,9 +209,12 @@ async def new_order(body:OrderModel, request:Request):
         "s_names": store_name_list
     }
     
-    h_id = str(DB.insert_one('history', history)) 
+    h_id = str(await DB.insert_one('history', history)) 
     _id = Util.check_id(body.u_id)
-    DB.update_one('user', {'_id':_id}, {'h_id':h_id})
+    await DB.update_one('user', {'_id':_id}, {'h_id':h_id})
+
+    # 주문 전에 /websockets/gaze로 받은 gaze가 있으면 주문 응답과 별개로 저장한다.
+    asyncio.create_task(finish_gaze_stream(body.u_id, h_id))
     return {
         'h_id': h_id,
         'order_list': response_list
@@ -218,38 +224,87 @@ async def new_order(body:OrderModel, request:Request):
 @order_router.post("/order/gaze")
 async def new_order(h_id: str, body: list[RawGazeModel], request:Request):
     assert TokenManager.is_buyer(request.state.token_scope), 403.1
-    SAVE_DIR = 'exhibition/gaze'
 
     gaze_data = []
     for page in body:
         gaze_data.append(page.dict())
 
+    await save_raw_gaze(h_id, gaze_data)
+
+
+@order_router.post("/order/gaze/packed")
+async def new_packed_gaze(h_id: str, request:Request):
+    """ page 별 x, y, t 배열을 msgpack으로 묶은 raw gaze를 받는다. (형식: v2.routers.src.gaze.PackedGaze) """
+    assert TokenManager.is_buyer(request.state.token_scope), 403.1
+
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    if content_type not in PackedGaze.CONTENT_TYPES:
+        raise CustomException(422.71, f'Content-Type must be one of {PackedGaze.CONTENT_TYPES}')
+
+    gaze_data = PackedGaze.unpack(await request.body())
+
+    await save_raw_gaze(h_id, gaze_data)
+
+
+async def save_raw_gaze(h_id:str, gaze_data:list):
+    """ raw gaze를 저장하고 history의 raw_gaze_path를 갱신한 뒤 전처리(fixation, aoi)를 시작한다. """
+    SAVE_DIR = 'exhibition/gaze'
+
     ## test 계정은 예외처리하기 위해 추가 (SYSYSY 디렉토리에 혹시몰라 저장하기는 함)
     _id = Util.check_id(h_id)
-    history = DB.read_one('history', {'_id':_id})
+    history = await DB.read_one('history', {'_id':_id}, {'u_id':1})
     u_id = Util.check_id(history['u_id'])
-    user = DB.read_one('user', {'_id': u_id})
+    user = await DB.read_one('user', {'_id': u_id}, {'id':1})
     if user['id'] == "test":
         SAVE_DIR = 'SYSYSY'
 
     try:
-        key = storage.upload(gaze_data, 'json', SAVE_DIR)
+        key = await storage.upload(gaze_data, 'json', SAVE_DIR)
     except CustomException as e:
         raise CustomException(e.status_code, f' -> h_id: \'{h_id}\'')
 
     try:
-        DB.update_one('history', {'_id':_id}, {'raw_gaze_path': key})
+        await DB.update_one('history', {'_id':_id}, {'raw_gaze_path': key})
     except CustomException as e:
         raise CustomException(e.status_code, f' -> h_id: \'{h_id}\', S3 key: \'{key}\'')
 
     # 임시로 비활성화
-    asyncio.create_task(preprocess_and_update(key, h_id))
+    asyncio.create_task(preprocess_and_update(key, h_id, gaze_data))
 
     # websocket_manager.app_connections[h_id]['gaze'] = True
 
 
-async def preprocess_and_update(raw_data_key:str, h_id:str):
+async def finish_gaze_stream(u_id:str, h_id:str):
+    """ u_id의 gaze spool을 raw gaze로 저장하고, 연결된 app에 gaze 수신 완료를 알린다. """
+    spooled = await gaze_spool.finalize(u_id)
+    if spooled is None:
+        return
+
+    gaze_data, paths = spooled
+    try:
+        await save_raw_gaze(h_id, gaze_data)
+    except CustomException as e:
+        print(f'ERROR Cannot save gaze stream -> h_id: \'{h_id}\', spool: {paths}, {e.status_code}{e.detail}')
+        return
+    gaze_spool.discard(paths)
+
+    if h_id in websocket_manager.app_connections:
+        websocket_manager.app_connections[h_id]['gaze'] = True
+
+
+async def preprocess_and_update(raw_data_key:str, h_id:str, gaze_data:list = None):
+    """ raw gaze에서 fixation, aoi 분석 결과를 만들어 history에 저장한다.
+
+        FIXATION_MODE
+        - remote(기본) : fixation filter, aoi 분석 모두 분석 서버(ANALYSIS_BASE_URL)에 요청한다.
+        - local       : fixation은 이 서버에서 FixationFilter로 계산하여 저장한다. (raw gaze를 다시 받지 않는다)
+                        ANALYSIS_BASE_URL이 설정된 경우에만 aoi 분석을 요청한다.
+    """
     load_dotenv()
+    if os.environ.get('FIXATION_MODE', 'remote').lower() == 'local':
+        await local_preprocess_and_update(raw_data_key, h_id, gaze_data)
+        return
+
     filter_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/filter/execute"
     aoi_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/aoi/analysis"
     headers = {"Content-Type": "application/json"}
@@ -259,10 +314,10 @@ async def preprocess_and_update(raw_data_key:str, h_id:str):
         # print(f'Request - h_id: \'{h_id}\'')
 
         _id = Util.check_id(h_id)
-        doc = DB.read_one('history', {'_id':_id})
+        doc = await DB.read_one('history', {'_id':_id})
         payload = {
         "raw_data_key": raw_data_key,
-        "meta_info": Meta.get_meta_detail(doc['date'])
+        "meta_info": await Meta.get_meta_detail(doc['date'])
         }
         # print(f'Request payload: \'{payload}\'')
 
@@ -277,7 +332,28 @@ async def preprocess_and_update(raw_data_key:str, h_id:str):
         # print(f'fixkey= {fix_key}, aoikey = {aoi_key}')
         print(f'----------Result GET - aoi_key: \'{aoi_key}\'')
         
-        DB.update_one('history', {'_id':_id}, {'fixation_path': fix_key, 'aoi_analysis': aoi_key})
+        await DB.update_one('history', {'_id':_id}, {'fixation_path': fix_key, 'aoi_analysis': aoi_key})
+
+
+async def local_preprocess_and_update(raw_data_key:str, h_id:str, gaze_data:list = None):
+    """ FIXATION_MODE=local: fixation을 직접 계산하여 exhibition/fixation에 저장한다. """
+    _id = Util.check_id(h_id)
+    if gaze_data is None:
+        gaze_data = await storage.get_json(raw_data_key)
+
+    fix_data = await run_in_threadpool(FixationFilter.filter_pages, gaze_data)
+    fix_key = await storage.upload(fix_data, 'json', 'exhibition/fixation')
+    print(f'----------Result LOCAL - fix_key: \'{fix_key}\'')
+
+    update = {'fixation_path': fix_key}
+    if os.environ.get('ANALYSIS_BASE_URL'):
+        aoi_url = os.environ['ANALYSIS_BASE_URL'] + "/anlz/v1/aoi/analysis"
+        async with httpx.AsyncClient() as client:
+            response = await client.get(aoi_url + f'?key={fix_key}')
+            update['aoi_analysis'] = response.json()["aoi_key"]
+        print(f'----------Result GET - aoi_key: \'{update["aoi_analysis"]}\'')
+
+    await DB.update_one('history', {'_id':_id}, update)
 
 # async def update_exhibition(h_id:str):
 #     load_dotenv()
@@ -291,18 +367,21 @@ async def preprocess_and_update(raw_data_key:str, h_id:str):
 async def get_history_list(u_id: str, request:Request, batch: int = 1):
     assert TokenManager.is_buyer(request.state.token_scope), 403.1
 
-    historys = DB.read_all('history', {'u_id':u_id}, asc_by='date', asc=False)
+    PER_PAGE = 10
+    total = await DB.count_documents('history', {'u_id':u_id})
+    max_batch = math.ceil(total / PER_PAGE)
 
-    if batch > 0 and batch < math.ceil(len(historys) / 10) + 1:
+    if batch > 0 and batch < max_batch + 1:
         response_list = []
 
-        batch_items = historys[10*(batch-1):10*batch]
+        batch_items = await DB.read_all('history', {'u_id':u_id}, {'date':1, 'total_price':1, 's_names':1},
+                                        asc_by='date', asc=False, skip=PER_PAGE*(batch-1), limit=PER_PAGE)
         for h in batch_items:
             if 's_names' in h.keys(): s_names = h['s_names']
             else: s_names = ["nothing", "is", 'here']
             response_list.append({
                 "h_id": h['_id'],
-                "date": Util.get_local_time(h['date']),
+                "date": h['date'],
                 "total_price": h['total_price'],
                 "s_names": s_names
             })
@@ -310,7 +389,7 @@ async def get_history_list(u_id: str, request:Request, batch: int = 1):
         raise CustomException(403.72)
     
     return {
-        'max_batch': math.ceil(len(historys) / 10),
+        'max_batch': max_batch,
         'history_list': response_list
     }
     
@@ -320,12 +399,11 @@ async def get_order_list(id: str, request:Request):
 
     _id = Util.check_id(id)     
 
-    history = DB.read_one('history', {'_id':_id})
+    history = await DB.read_one('history', {'_id':_id})
 
     order_list = []
-    for o_id in history['orders']:
-        _id = Util.check_id(o_id)  
-        order = DB.read_one('order', {'_id':_id})
+    orders = await DB.read_many_by_ids('order', history['orders'], {'s_name':1, 'f_list':1})
+    for order in orders:
         s_name = order['s_name']
         for f in order['f_list']:
             if 'f_name' in f.keys(): f_name = f['f_name']
@@ -338,7 +416,7 @@ async def get_order_list(id: str, request:Request):
             })
     
     return {
-        'date': Util.get_local_time(history['date']),
+        'date': history['date'],
         'order_list': order_list
     }
 
@@ -361,19 +439,25 @@ async def get_dates(request:Request, s_id: str, batch: int=1, start_date:str = N
             "$lte": Util.get_utc_time_by_str(end_date) + timedelta(days=1)
         }
 
-    aggreagted_data = DB.aggregate_pipline('order', pipeline)
+    if batch < 1:
+        raise CustomException(403.72)
+
+    # 날짜별 합계는 DB에서 페이지 단위로 잘라서 받아온다.
+    pipeline.append({ "$facet": {
+        "total": [ { "$count": "count" } ],
+        "dates": [ { "$skip": (batch - 1) * PER_PAGE }, { "$limit": PER_PAGE } ]
+    }})
+
+    aggreagted_data = (await DB.aggregate_pipline('order', pipeline))[0]
     
-    distinct_dates = []
-    for entry in aggreagted_data:
-        distinct_dates.append({
+    paginated_dates = []
+    for entry in aggreagted_data["dates"]:
+        paginated_dates.append({
             "date": entry["_id"],
             "total_price": entry["total_price"]
         })
 
-    total_dates = len(distinct_dates)
-    start_idx = (batch - 1) * PER_PAGE
-    end_idx = start_idx + PER_PAGE
-    paginated_dates = distinct_dates[start_idx:end_idx]
+    total_dates = aggreagted_data["total"][0]["count"] if aggreagted_data["total"] else 0
 
     return {
         'max_batch': math.ceil(total_dates / PER_PAGE),
@@ -393,21 +477,21 @@ async def get_history_list(request:Request, s_id: str, date: str):
         "s_id": s_id
     }
 
-    orders = DB.read_all('order', query, asc_by='date', asc=False)
+    orders = await DB.read_all('order', query, {'date':1, 'f_list':1, 'total_price':1}, asc_by='date', asc=False)
 
     result = []
 
     for o in orders:
         result.append({
             'o_id': o['_id'],
-            'date': Util.get_local_time(o['date']),
+            'date': o['date'],
             'detail': o['f_list'],
             'total': o['total_price']
         })
     
-    return {
+    return FastJSONResponse({
         'order_list' : result
-    }
+    })
      
 
 @order_router.get("/report")
@@ -415,7 +499,7 @@ async def get_history_list(request:Request, s_id: str, date: str):
     assert TokenManager.is_seller(request.state.token_scope), 403.1
 
     id = Util.check_id(s_id)
-    store = DB.read_one('store', {"_id": id})
+    store = await DB.read_one('store', {"_id": id})
     
     date = Util.get_utc_time_by_str(date)
 
@@ -423,7 +507,7 @@ async def get_history_list(request:Request, s_id: str, date: str):
         { "$match": { "date": date } },
         { "$project": { "_id":0, f'Store {store["num"]}':1 }}
     ]
-    aggreagted_data = DB.aggregate_pipline('daily', pipeline)
+    aggreagted_data = await DB.aggregate_pipline('daily', pipeline)
 
     if aggreagted_data == []:
         raise CustomException(404.11)
@@ -434,5 +518,5 @@ async def get_history_list(request:Request, s_id: str, date: str):
     
     return {
         "date": Util.get_local_time(date).strftime("%Y-%m-%d"),
-        "daily_report": storage.get_json(report_key)
+        "daily_report": await storage.get_json(report_key)
     }
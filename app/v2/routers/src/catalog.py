@@ -0,0 +1,38 @@
+import os
+from dotenv import load_dotenv
+from core.common.cache import LRUCache
+
+load_dotenv()
+
+class Catalog:
+    """ 자주 바뀌지 않는 store, menu, food 조회 결과를 보관하는 read-through cache
+
+        key는 (tag, ...) 형태이며, 변경이 일어나는 API에서 관련 tag를 무효화한다.
+        - ('stores',) / ('store', s_id)
+        - ('foods', s_id) / ('food', f_id)
+        - ('menu_foods', m_id)
+        - ('exhibition_food', s_num, f_num)
+        process 마다 따로 보관되므로 다른 process의 변경은 TTL(CATALOG_CACHE_TTL, 초) 이후에 반영된다.
+    """
+    cache = LRUCache('catalog', maxsize=2048, ttl=float(os.environ.get('CATALOG_CACHE_TTL', '60')))
+
+    @staticmethod
+    async def get(key:tuple, loader):
+        return await Catalog.cache.get_or_load(key, loader)
+
+    @staticmethod
+    def invalidate_store(s_id:str = None):
+        """ 가게 정보가 바뀌면 가게 목록과 가게 이름을 포함한 메뉴판 응답을 지운다. """
+        Catalog.cache.invalidate_tag('stores')
+        Catalog.cache.invalidate_tag('menu_foods')
+        if s_id is not None:
+            Catalog.cache.invalidate(('store', s_id))
+
+    @staticmethod
+    def invalidate_food(f_id:str = None):
+        """ 음식 정보가 바뀌면 음식 목록, 음식을 포함한 메뉴판, exhibition 음식 이름 응답을 지운다. """
+        Catalog.cache.invalidate_tag('foods')
+        Catalog.cache.invalidate_tag('menu_foods')
+        Catalog.cache.invalidate_tag('exhibition_food')
+        if f_id is not None:
+            Catalog.cache.invalidate(('food', f_id))
@@ -0,0 +1,200 @@
+import os
+import time
+import uuid
+import asyncio
+import tempfile
+import contextlib
+import orjson
+import msgpack
+import numpy as np
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from core.error.exception import CustomException
+from .util import Util
+
+
+class PackedGaze:
+    """ page 별로 x, y, t를 배열(little-endian buffer)로 묶어 보내는 raw gaze 형식 (Content-Type: application/x-msgpack)
+
+        body는 아래 map들의 msgpack array이다.
+        - page: str, s_num: int, f_num: int
+        - x, y: float32 배열 (NaN은 좌표가 없는 sample, 기존 형식에서 x 또는 y가 빠진 point)
+        - t: int64 배열 (x, y와 길이가 같아야 한다)
+        검증은 page 단위로 NumPy에서 한 번에 수행하고, 저장은 기존 /order/gaze와 같은 JSON 형식으로 변환한다.
+    """
+    CONTENT_TYPES = ('application/x-msgpack', 'application/msgpack')
+    DTYPES = {'x': np.dtype('<f4'), 'y': np.dtype('<f4'), 't': np.dtype('<i8')}
+
+    @staticmethod
+    def unpack(body:bytes) -> list:
+        try:
+            pages = msgpack.unpackb(body, raw=False)
+        except Exception:
+            raise CustomException(422.71, 'body is not msgpack')
+
+        if not isinstance(pages, list):
+            raise CustomException(422.71, 'body must be a list of pages')
+        return [PackedGaze.to_page(i, page) for i, page in enumerate(pages)]
+
+    @staticmethod
+    def to_page(index:int, page) -> dict:
+        """ 한 page의 배열을 검증하고 {page, s_num, f_num, gaze: [{x, y, t}]} 형식으로 변환한다. """
+        if not isinstance(page, dict):
+            raise CustomException(422.71, f'page[{index}] must be a map')
+        if not isinstance(page.get('page'), str) or type(page.get('s_num')) is not int or type(page.get('f_num')) is not int:
+            raise CustomException(422.71, f'page[{index}] needs page(str), s_num(int), f_num(int)')
+
+        arrays = {}
+        for name, dtype in PackedGaze.DTYPES.items():
+            buffer = page.get(name)
+            if not isinstance(buffer, bytes) or len(buffer) % dtype.itemsize:
+                raise CustomException(422.71, f'page[{index}].{name} must be a {dtype.name} little-endian buffer')
+            arrays[name] = np.frombuffer(buffer, dtype=dtype)
+
+        x, y, t = arrays['x'], arrays['y'], arrays['t']
+        if not len(x) == len(y) == len(t):
+            raise CustomException(422.71, f'page[{index}] x, y, t lengths differ ({len(x)}, {len(y)}, {len(t)})')
+        if np.isinf(x).any() or np.isinf(y).any():
+            raise CustomException(422.71, f'page[{index}] x, y must be finite or NaN')
+        if (t < 0).any():
+            raise CustomException(422.71, f'page[{index}] t must not be negative')
+
+        # float32 값을 그대로 float로 바꾸면 0.3499999940395355 처럼 길어지므로 float32 정밀도(소수점 6자리)로 맞춘다.
+        xs = np.round(x.astype(np.float64), 6).tolist()
+        ys = np.round(y.astype(np.float64), 6).tolist()
+        gaze = [{'x': px, 'y': py, 't': pt} for px, py, pt in zip(xs, ys, t.tolist())]
+        for i in np.flatnonzero(np.isnan(x)).tolist():
+            del gaze[i]['x']
+        for i in np.flatnonzero(np.isnan(y)).tolist():
+            del gaze[i]['y']
+
+        return {
+            'page': page['page'],
+            's_num': page['s_num'],
+            'f_num': page['f_num'],
+            'gaze': gaze
+        }
+
+
+class GazeSpool:
+    """ 주문 전에 WebSocket으로 조금씩 받은 raw gaze를 연결(session) 별 local 파일(JSON lines)에 이어 쓰는 spool
+
+        - open: 연결마다 새 session 파일 <u_id>.<session>.jsonl을 만들고 session id를 반환한다.
+        - append: 받은 page 목록을 session 파일에 한 줄씩 추가한다.
+        - finalize: 주문 시 u_id의 session 파일들을 떼어내어 page 목록(기존 /order/gaze 형식)으로 합쳐 반환한다.
+          같은 page가 연속으로 들어온 경우 하나의 page로 합친다.
+          떼어낸 session에는 더 이상 쓸 수 없으므로(422.73) 주문 후 계속 연결된 app의 gaze가 다음 주문에 섞이지 않는다.
+        - GAZE_SPOOL_TTL(초) 동안 추가되지 않은 session 파일은 open, finalize 시 버린다. (주문하지 않고 떠난 방문자)
+    """
+    SUFFIX = '.jsonl'
+
+    def __init__(self) -> None:
+        load_dotenv()
+        self.directory = os.environ.get('GAZE_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'fie-gaze-spool'))
+        self.ttl = float(os.environ.get('GAZE_SPOOL_TTL', '3600'))
+        self.max_bytes = int(float(os.environ.get('GAZE_SPOOL_MAX_MB', '64')) * 2**20)
+        # u_id -> [lock, 사용 중(대기 포함)인 작업 수], 사용하는 작업이 없으면 지운다.
+        self.locks = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, u_id:str, session:str) -> str:
+        Util.check_id(u_id)
+        return os.path.join(self.directory, f'{u_id}.{session}{self.SUFFIX}')
+
+    def sessions(self, u_id:str) -> list:
+        """ u_id의 session 파일 경로를 생성 순서대로 반환한다. """
+        Util.check_id(u_id)
+        prefix = f'{u_id}.'
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.startswith(prefix) and name.endswith(self.SUFFIX))
+
+    def is_stale(self, path:str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) > self.ttl
+        except FileNotFoundError:
+            return False
+
+    @contextlib.asynccontextmanager
+    async def lock(self, u_id:str):
+        """ u_id 단위 lock. 기다리거나 가진 작업이 없어지면 lock을 지워 locks가 사용자 수만큼 쌓이지 않게 한다. """
+        entry = self.locks.setdefault(u_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[u_id]
+
+    async def open(self, u_id:str) -> str:
+        """ 스트리밍 연결 시 호출한다. 오래된 session은 지우고, 새 session을 만들어 session id를 반환한다. """
+        # session id는 생성 시각 순으로 정렬되도록 만든다. (재연결 시 finalize에서 받은 순서대로 합친다)
+        session = f'{time.time_ns():016x}{uuid.uuid4().hex[:8]}'
+        path = self.path(u_id, session)
+        async with self.lock(u_id):
+            for stale in filter(self.is_stale, self.sessions(u_id)):
+                self.discard([stale])
+            open(path, 'xb').close()
+        return session
+
+    async def append(self, u_id:str, session:str, pages:list) -> int:
+        """ page 목록을 session 파일에 추가하고 추가된 sample 수를 반환한다. """
+        path = self.path(u_id, session)
+        lines = b''.join(orjson.dumps(page) + b'\n' for page in pages)
+
+        async with self.lock(u_id):
+            size = sum(os.path.getsize(p) for p in self.sessions(u_id) if os.path.exists(p))
+            if size + len(lines) > self.max_bytes:
+                raise CustomException(422.72, f'u_id: \'{u_id}\'')
+            try:
+                await run_in_threadpool(self.write, path, lines)
+            except FileNotFoundError:
+                raise CustomException(422.73, f'u_id: \'{u_id}\'')
+
+        return sum(len(page['gaze']) for page in pages)
+
+    @staticmethod
+    def write(path:str, lines:bytes) -> None:
+        """ 이미 있는 session 파일에만 추가한다. (finalize로 떼어낸 session은 다시 만들지 않는다) """
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        with os.fdopen(fd, 'ab') as f:
+            f.write(lines)
+
+    async def finalize(self, u_id:str) -> tuple[list, list] | None:
+        """ u_id의 session 파일들을 떼어내어 (page 목록, 떼어낸 파일 경로 목록)을 반환한다. spool이 없으면 None을 반환한다.
+            GAZE_SPOOL_TTL보다 오래된 session은 버린다. 저장이 끝나면 discard(paths)로 파일을 지운다. """
+        closed = []
+        async with self.lock(u_id):
+            for path in self.sessions(u_id):
+                if self.is_stale(path):
+                    self.discard([path])
+                    continue
+                closed.append(f'{path}.closed')
+                os.replace(path, closed[-1])
+
+        if not closed:
+            return None
+        return await run_in_threadpool(self.read, closed), closed
+
+    @staticmethod
+    def read(paths:list) -> list:
+        pages = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                for line in f:
+                    page = orjson.loads(line)
+                    last = pages[-1] if pages else None
+                    if last and (last['page'], last['s_num'], last['f_num']) == (page['page'], page['s_num'], page['f_num']):
+                        last['gaze'].extend(page['gaze'])
+                    else:
+                        pages.append(page)
+        return pages
+
+    @staticmethod
+    def discard(paths:list) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -1,54 +1,103 @@
+import bisect
 from bson.objectid import ObjectId
-from datetime import datetime
-from core.common.mongo import MongodbController
+from datetime import datetime, timedelta
+from core.common.mongo import AsyncMongodbController
+from core.common.cache import LRUCache
 from .util import Util
 
 class Meta:
-    DB = MongodbController('FIE_DB2')
+    DB = AsyncMongodbController('FIE_DB2')
+
+    # 'temp'에 저장된 meta 버전들을 date 오름차순으로 보관한다. (dates는 binary search용)
+    timeline = []
+    dates = []
+    ids = set()
+    # 이 시각 이전에 생성된 버전은 모두 timeline에 존재한다.
+    checked_at = None
+    # 다른 process가 date를 찍은 뒤 늦게 insert를 commit한 버전도 놓치지 않도록 checked_at을 이만큼 앞당긴다.
+    # (이 구간의 버전은 다시 조회되지만 ids로 중복 추가를 막는다)
+    REFRESH_MARGIN = timedelta(seconds=60)
+    # meta 버전(_id)별 get_detail 결과
+    details = LRUCache('meta_detail', maxsize=128)
 
     @staticmethod
-    def create(content: dict):
+    async def create(content: dict):
 
         try:
             meta = {
-                'date': Util.get_utc_time().now(),
+                'date': Util.get_utc_time(),
                 'content': content
             }
-            new_id = Meta.DB.insert_one('temp', meta)
+            new_id = await Meta.DB.insert_one('temp', meta)
+            meta['_id'] = str(new_id)
+            Meta.add_to_timeline(meta)
             return new_id
         
         except:
             print('fail')
-    
+
+    @staticmethod
+    def add_to_timeline(meta: dict):
+        if meta['_id'] in Meta.ids:
+            return
+
+        i = bisect.bisect_right(Meta.dates, meta['date'])
+        Meta.dates.insert(i, meta['date'])
+        Meta.timeline.insert(i, meta)
+        Meta.ids.add(meta['_id'])
+
     @staticmethod
-    def get_meta(date=Util.get_utc_time().now()):
+    async def refresh_timeline(date):
         '''
-            주어진 날짜 기준에서의 Meta data를 불러온다.
+            date 이전의 버전 중 timeline에 없는 것을 불러온다.
+            - 최초 호출 시 : date 이전의 모든 버전
+            - 이후 : 마지막 확인 이후 다른 process에서 생성되었을 수 있는 버전 (date index 범위 query, 보통 0~1개)
         '''
-        try:
-            data_list = Meta.DB.read_all('temp', asc_by='date', asc=False)
-            
-        except:
-            return None  
+        start = Util.get_utc_time()
+
+        if Meta.checked_at is None:
+            query = {'date': {'$lt': date}}
+        else:
+            query = {'date': {'$gte': Meta.checked_at, '$lt': date}}
+        data_list = await Meta.DB.read_all('temp', query, asc_by='date', asc=True)
 
-        result = data_list[0]
         for data in data_list:
-            if data['date'] < date:
-                return data
-            else:
-                result = data
+            Meta.add_to_timeline(data)
+
+        checked_at = min(date, start - Meta.REFRESH_MARGIN)
+        if Meta.checked_at is None or checked_at > Meta.checked_at:
+            Meta.checked_at = checked_at
+    
+    @staticmethod
+    async def get_meta(date=None):
+        '''
+            주어진 날짜 기준에서의 Meta data를 불러온다. (날짜가 없으면 현재 시간 기준)
+            - date 이전에 생성된 가장 최근 버전을 timeline에서 binary search로 찾는다.
+            - 해당하는 버전이 없으면 None을 반환한다.
+        '''
+        if date is None:
+            date = Util.get_utc_time()
+
+        if Meta.checked_at is None or date > Meta.checked_at:
+            try:
+                await Meta.refresh_timeline(date)
+            except:
+                return None
+
+        i = bisect.bisect_left(Meta.dates, date)
+        if i == 0:
+            return None
+        return Meta.timeline[i-1]
 
     @staticmethod
-    def get_detail(content: dict):
+    async def get_detail(content: dict):
 
         try:
 
-            s_id_list = content.keys()
-            m_id_list = content.values()
-            query = {'_id': {'$in':  Meta.to_ObjectId_list(s_id_list)}}
-            store_documents = Meta.DB.read_all('store', query)
-            query = {'_id': {'$in':  Meta.to_ObjectId_list(m_id_list)}}
-            menu_documents = Meta.DB.read_all('menu', query)
+            s_id_list = list(content.keys())
+            m_id_list = list(content.values())
+            store_documents = await Meta.DB.read_many_by_ids('store', s_id_list, {'num': 1})
+            menu_documents = await Meta.DB.read_many_by_ids('menu', m_id_list, {'f_list': 1})
             
             new_dict = {}
             for i in range(len(s_id_list)):
@@ -78,6 +127,16 @@ class Meta:
         return result
     
     @staticmethod
-    def get_meta_detail(date):
-        data = Meta.get_meta(date)
-        return Meta.get_detail(data['content'])
\ No newline at end of file
+    async def get_meta_detail(date):
+        '''
+            주어진 날짜 기준의 {s_num: [f_num, ...]} 정보를 반환한다.
+            meta 버전은 생성 이후 바뀌지 않으므로 버전(_id)별로 결과를 보관하여 재사용한다.
+        '''
+        data = await Meta.get_meta(date)
+
+        detail = Meta.details.get(data['_id'])
+        if detail is None:
+            detail = await Meta.get_detail(data['content'])
+            if detail is not None:
+                Meta.details.set(data['_id'], detail)
+        return detail
\ No newline at end of file
@@ -2,7 +2,9 @@ from bson.objectid import ObjectId
 from datetime import datetime, timedelta
 import pytz
 from core.error.exception import CustomException
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
+
+DB = AsyncMongodbController('FIE_DB2')
 
 class Util:
 
@@ -66,33 +68,30 @@ class Util:
 
 
     @staticmethod
-    def delete_user_hid(h_id:str) -> bool:
+    async def delete_user_hid(h_id:str) -> bool:
         """
             h_id를 받아서 user의 진행중인 주문 내역을 초기화한다.
         """
-        DB = MongodbController('FIE_DB2')
         _id = Util.check_id(h_id)
-        history = DB.read_one('history', {'_id': _id})
+        history = await DB.read_one('history', {'_id': _id})
         _id = Util.check_id(history['u_id'])
-        return DB.update_one('user', {'_id':_id}, {'h_id':""})
+        return await DB.update_one('user', {'_id':_id}, {'h_id':""})
 
     @staticmethod
-    def is_done(h_id:str) -> str:
+    async def is_done(h_id:str) -> str:
         """
             해당 주문과 관련된 order들이 모두 완료되었는지 확인한다.
              - 만약 완료되었으면 사용자 정보에서 진행중인 주문을 삭제하고 True를 리턴한다.
              - 완료되지 않았으면 False를 리턴한다.
         """
-        DB = MongodbController('FIE_DB2')
         _id = Util.check_id(h_id)
-        history = DB.read_one('history', {'_id':_id})
-        for o_id in history["orders"]:
-            _id = Util.check_id(o_id)
-            order = DB.read_one('order', {'_id':_id})
-            if order['status'] !=2:
-                return False
+        history = await DB.read_one('history', {'_id':_id}, {'orders':1})
+        order_ids = [Util.check_id(o_id) for o_id in history['orders']]
+        # 완료되지 않은 주문이 하나라도 있는지만 확인한다. (주문 document는 받아오지 않는다)
+        if await DB.count_documents('order', {'_id': {'$in': order_ids}, 'status': {'$ne': 2}}, limit=1):
+            return False
         
-        if Util.delete_user_hid(h_id):
+        if await Util.delete_user_hid(h_id):
             return True
         else:
             pass
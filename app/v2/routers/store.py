@@ -3,11 +3,13 @@ store_router
 """
 
 from fastapi import APIRouter, Depends, Request, HTTPException
+from pymongo.errors import DuplicateKeyError
 from core.models.store import StoreModel, NameModel
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from core.common.authority import AuthManagement, TokenManagement
 from core.error.exception import CustomException
 from .src.util import Util
+from .src.catalog import Catalog
 
 
 AuthManager = AuthManagement()
@@ -16,7 +18,7 @@ TokenManager = TokenManagement()
 store_router = APIRouter(prefix="/stores", dependencies=[Depends(TokenManager.dispatch)])
 
 PREFIX = 'api/v2/stores'
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 
 
 @store_router.get("/hello")
@@ -28,11 +30,7 @@ async def read_all_store(request: Request):
     """ DB에 존재하는 모든 식당의 정보를 받아온다 """
     assert TokenManager.is_buyer(request.state.token_scope), 403.1  
 
-    result = DB.read_all('store')
-    response = []
-
-    for r in result:
-        response.append(r)
+    response = await Catalog.get(('stores',), lambda: DB.read_all('store'))
   
     return {
         'store_list' : response
@@ -45,7 +43,7 @@ async def read_store(id:str):
 
     _id = Util.check_id(id)
 
-    response = DB.read_one('store', {'_id':_id})
+    response = await Catalog.get(('store', id), lambda: DB.read_one('store', {'_id':_id}))
 
     return response
 
@@ -55,7 +53,7 @@ async def check_duplicate_name(data:NameModel, request:Request):
     """ store name의 중복 여부를 확인한다. """
     assert TokenManager.is_seller(request.state.token_scope), 403.1 
 
-    if AuthManager.check_dup('store', {'name':data.name}):
+    if await AuthManager.exists('store', 'name', data.name):
         state = 'unavailable'
     else:
         state = 'available'
@@ -73,21 +71,25 @@ async def create_store(u_id:str, store:StoreModel, request:Request):
 
     u_id = Util.check_id(u_id)
 
-    name_data = NameModel(name=store.name)
-    state = await check_duplicate_name(name_data, request)
-    if state == 'unavailable':
+    if await AuthManager.exists('store', 'name', store.name):
         raise CustomException(409.2)
     
-    store_list = DB.read_all('store')
+    store_list = await DB.read_all('store')
     if not store_list: # store 최초 등록
         data['num'] = 1
     else:
         max_num = max(store["num"] for store in store_list)
         data['num'] = max_num + 1
 
-    id = str(DB.insert_one('store', data))
+    try:
+        id = str(await DB.insert_one('store', data))
+    except DuplicateKeyError:
+        raise CustomException(409.2)
+    finally:
+        AuthManager.mark_taken('store', 'name', store.name)
+    Catalog.invalidate_store()
     
-    DB.update_one('user', {'_id':u_id}, {'s_id': id})
+    await DB.update_one('user', {'_id':u_id}, {'s_id': id})
     
     return {
         'document_id': id
@@ -105,9 +107,14 @@ async def update_store(id:str, store: StoreModel, request:Request):
     
     _id = Util.check_id(id)
 
-    store =  AuthManager.check_dup('store', {'name':store.name})
-    
-    if store and store['_id'] != id:
+    # 같은 이름의 다른 가게가 있는지 _id만 읽어 확인한다.
+    if await DB.exists('store', {'name':store.name, '_id': {'$ne':_id}}):
         raise CustomException(409.2)
     
-    DB.update_one('store', {'_id':_id}, data)
+    try:
+        await DB.update_one('store', {'_id':_id}, data)
+    except DuplicateKeyError:
+        raise CustomException(409.2)
+    finally:
+        AuthManager.mark_taken('store', 'name', store.name)
+    Catalog.invalidate_store(id)
@@ -4,11 +4,12 @@ user_router
 
 from .src.util import Util
 from core.models import *
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from core.common.authority import AuthManagement, TokenManagement
 from core.error.exception import CustomException
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from pymongo.errors import DuplicateKeyError
 
 user_router = APIRouter(prefix="/users")
 
@@ -17,7 +18,7 @@ TokenManager = TokenManagement()
 
 PREFIX = 'api/v2/users'
 
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", scheme_name="JWT")
 
 
@@ -28,7 +29,7 @@ async def hello():
 
 @user_router.post('/idcheck')
 async def check_duplicate_id(data: IdModel):
-    if AuthManager.check_dup('user', {'id':data.id}):
+    if await AuthManager.exists('user', 'id', data.id):
         state = 'unavailable'
     else:
         state = 'available'
@@ -37,26 +38,37 @@ async def check_duplicate_id(data: IdModel):
     }
 
 
+async def insert_user(user:dict):
+    """ user를 추가한다. 같은 id가 이미 있으면 (user.id unique index) 409.1을 반환한다. """
+    try:
+        u_id = await DB.insert_one('user', user)
+    except DuplicateKeyError:
+        raise CustomException(status_code=409.1)
+    finally:
+        AuthManager.mark_taken('user', 'id', user['id'])
+    return u_id
+
+
 """
 buyer API
 """
 
 @user_router.post('/buyer/signup')
 async def buyer_signup(data: BuyerModel):
-    if AuthManager.check_dup('user', {'id':data.id}) == False:
-        user = {
-            'id': data.id,
-            'pw': AuthManager.get_hashed_pw(data.pw),
-            'scope': "buyer",
-            'name': data.name,
-            'gender': data.gender.value,
-            'age': data.age,
-            'R_Token': '',
-            'camera': 0
-        }
-        u_id = str(DB.insert_one('user', user))
-    else:
+    if await AuthManager.exists('user', 'id', data.id):
         raise CustomException(409.1)
+
+    user = {
+        'id': data.id,
+        'pw': await AuthManager.get_hashed_pw(data.pw),
+        'scope': "buyer",
+        'name': data.name,
+        'gender': data.gender.value,
+        'age': data.age,
+        'R_Token': '',
+        'camera': 0
+    }
+    u_id = str(await insert_user(user))
     
     return {
         'u_id': u_id
@@ -65,32 +77,28 @@ async def buyer_signup(data: BuyerModel):
 
 @user_router.post('/buyer/login')
 async def buyer_login(data: OAuth2PasswordRequestForm = Depends()):
-    u_id = AuthManager.get_uid(data.username)
-
-    _id = Util.check_id(u_id)
-
-    user = AuthManager.auth_user(u_id, data.password)
+    u_id = await AuthManager.login(data.username, data.password)
 
     a_token = TokenManager.init_a_token(u_id, "buyer")
-    user['R_Token'] = TokenManager.init_r_token(u_id, "buyer")
+    r_token = TokenManager.init_r_token(u_id, "buyer")
 
-    DB.update_one('user', {'_id':_id}, {'R_Token': user['R_Token']})
-    response = DB.read_one('user', {'_id':_id})
+    # refresh token을 저장하면서 응답에 필요한 field만 함께 받아온다.
+    response = await DB.find_one_and_update('user', {'_id':Util.check_id(u_id)}, {'$set': {'R_Token': r_token}},
+                                            {'name':1, 'camera':1, 'h_id':1})
+    if response is None:
+        raise CustomException(status_code=401.1)
 
     result = {
         'u_id': u_id,
         'name': response['name'],
         'token_type': "bearer",
         'A_Token': a_token,
-        'R_Token': user['R_Token'],
+        'R_Token': r_token,
         'camera': response['camera']
     }
-    try:
-        # 현재 db에 아예 h_id field가 없는 경우가 많아서 일시적인 조치
-        h_id = response['h_id']
-    except:
-        h_id = ""
-    if h_id and Util.is_done(h_id):
+    # 현재 db에 아예 h_id field가 없는 경우가 많아서 일시적인 조치
+    h_id = response.get('h_id', "")
+    if h_id and await Util.is_done(h_id):
         result['h_id'] = ""
     else:
         result['h_id'] = h_id
@@ -102,7 +110,7 @@ async def get_buyer_info(u_id:str, data: PwModel, token:str = Depends(TokenManag
     scope = TokenManager.get_payload('access', token).get("scope")
     assert TokenManager.is_buyer(scope), 403.1    
     
-    user = AuthManager.auth_user(u_id, data.pw)
+    user = await AuthManager.auth_user(u_id, data.pw)
     
     return {
         'id': user['id'],
@@ -120,11 +128,11 @@ async def change_buyer_info(u_id:str, data: BuyerModifyModel, token:str = Depend
 
     _id = Util.check_id(u_id)
 
-    if u_id != AuthManager.get_uid(data.id):
+    if u_id != await AuthManager.get_uid(data.id):
         raise CustomException(401.1)
     
-    AuthManager.auth_user(u_id, data.old_pw)
-    new_hashed_pw = AuthManager.get_hashed_pw(data.new_pw)
+    await AuthManager.auth_user(u_id, data.old_pw)
+    new_hashed_pw = await AuthManager.get_hashed_pw(data.new_pw)
 
     new_data = {
         'pw': new_hashed_pw,
@@ -134,7 +142,7 @@ async def change_buyer_info(u_id:str, data: BuyerModifyModel, token:str = Depend
         'camera': data.camera.value
     }
 
-    DB.update_one('user', {'_id':_id}, new_data)
+    await DB.update_one('user', {'_id':_id}, new_data)
     
 
 @user_router.put('/buyer/camera')
@@ -144,7 +152,7 @@ async def change_buyer_info(u_id:str, data:Camera, token:str = Depends(TokenMana
 
     _id = Util.check_id(u_id)
 
-    DB.update_one('user', {'_id':_id}, {'camera': data.camera.value})
+    await DB.update_one('user', {'_id':_id}, {'camera': data.camera.value})
 
 
 
@@ -154,17 +162,17 @@ seller API
 
 @user_router.post('/seller/signup')
 async def seller_signup(data: SellerModel):
-    if AuthManager.check_dup('user', {'id':data.id}) == False:
-        user = {
-            "id": data.id,
-            "pw": AuthManager.get_hashed_pw(data.pw),
-            "scope": "seller",
-            "s_id": '',
-            "R_Token": ""
-        }
-        u_id = str(DB.insert_one('user', user))
-    else:
+    if await AuthManager.exists('user', 'id', data.id):
         raise CustomException(status_code=409.1)
+
+    user = {
+        "id": data.id,
+        "pw": await AuthManager.get_hashed_pw(data.pw),
+        "scope": "seller",
+        "s_id": '',
+        "R_Token": ""
+    }
+    u_id = str(await insert_user(user))
     
     return {
         "u_id": u_id
@@ -173,23 +181,22 @@ async def seller_signup(data: SellerModel):
 
 @user_router.post('/seller/login')
 async def seller_login(data: OAuth2PasswordRequestForm = Depends()):
-    u_id = AuthManager.get_uid(data.username)
-
-    _id = Util.check_id(u_id)
-
-    user = AuthManager.auth_user(u_id, data.password)
+    u_id = await AuthManager.login(data.username, data.password)
 
     a_token = TokenManager.init_a_token(u_id, "seller")
-    user['R_Token'] = TokenManager.init_r_token(user['_id'], "seller")
+    r_token = TokenManager.init_r_token(u_id, "seller")
 
-    DB.update_one('user', {'_id':_id}, {"R_Token": user['R_Token']})
+    response = await DB.find_one_and_update('user', {'_id':Util.check_id(u_id)}, {'$set': {'R_Token': r_token}},
+                                            {'s_id':1})
+    if response is None:
+        raise CustomException(status_code=401.1)
 
     return {
-        'u_id': user['_id'],
-        's_id': user['s_id'],
+        'u_id': u_id,
+        's_id': response['s_id'],
         'token_type': "bearer",
         'A_Token': a_token,
-        'R_Token': user['R_Token']
+        'R_Token': r_token
     }
 
 
@@ -198,7 +205,7 @@ async def get_seller_info(u_id:str, data: PwModel, token:str = Depends(TokenMana
     scope = TokenManager.get_payload('access', token).get("scope")
     assert TokenManager.is_seller(scope), 403.1
 
-    user = AuthManager.auth_user(u_id, data.pw)
+    user = await AuthManager.auth_user(u_id, data.pw)
 
     return {
         'id': user['id'],
@@ -212,17 +219,17 @@ async def change_seller_info(u_id:str, data: SellerModifyModel, token:str = Depe
 
     _id = Util.check_id(u_id)
 
-    if u_id != AuthManager.get_uid(data.id):
+    if u_id != await AuthManager.get_uid(data.id):
         raise CustomException(401.1)
     
-    AuthManager.auth_user(u_id, data.old_pw)
-    new_hashed_pw = AuthManager.get_hashed_pw(data.new_pw)
+    await AuthManager.auth_user(u_id, data.old_pw)
+    new_hashed_pw = await AuthManager.get_hashed_pw(data.new_pw)
 
     new_data = {
         'pw': new_hashed_pw,
     }
 
-    DB.update_one('user', {'_id':_id}, new_data)
+    await DB.update_one('user', {'_id':_id}, new_data)
 
 
 """
@@ -234,7 +241,7 @@ Token renewal API
 async def get_access_token(u_id:str, r_token: str = Depends(TokenManager.auth_r_token)):
     _id = Util.check_id(u_id)
     
-    user = DB.read_one('user', {'_id':_id})
+    user = await DB.read_one('user', {'_id':_id})
 
     if user['R_Token'] != r_token:
         raise CustomException(status_code=422.62)
@@ -251,14 +258,14 @@ async def get_access_token(u_id:str, r_token: str = Depends(TokenManager.auth_r_
 async def get_refresh_token(u_id:str, r_token: str = Depends(TokenManager.auth_r_token)):
     _id = Util.check_id(u_id)
 
-    user = DB.read_one('user', {'_id':_id})
+    user = await DB.read_one('user', {'_id':_id})
 
     if user['R_Token'] != r_token:
         raise CustomException(status_code=422.62)
     
     response = TokenManager.recreate_r_token(r_token, u_id, user['scope'])
 
-    DB.update_one('user', {'_id':_id}, {"R_Token": response})
+    await DB.update_one('user', {'_id':_id}, {"R_Token": response})
 
     return {
         'R_Token': response
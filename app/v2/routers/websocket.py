@@ -3,15 +3,24 @@ websocket_router
 """
 
 from fastapi import APIRouter
-from core.common.mongo import MongodbController
+from core.common.mongo import AsyncMongodbController
 from core.common.websocket import ConnectionManager
+from core.common.authority import TokenManagement
+from core.error.exception import CustomException, APIException
+from core.models import RawGazeModel
+from .src.gaze import PackedGaze, GazeSpool
 
+import orjson
+import asyncio
+from pydantic import ValidationError
 from fastapi import WebSocket, WebSocketDisconnect
 
 websocket_router = APIRouter(prefix="/websockets")
 
 PREFIX = 'api/v2/websockets'
-DB = MongodbController('FIE_DB2')
+DB = AsyncMongodbController('FIE_DB2')
+# gaze stream 연결 후 첫 message(token)를 기다리는 시간(초)
+AUTH_TIMEOUT = 10
 
 @websocket_router.get("/hello")
 async def hello():
@@ -19,6 +28,8 @@ async def hello():
 
 
 websocket_manager = ConnectionManager()
+gaze_spool = GazeSpool()
+TokenManager = TokenManagement()
 
 @websocket_router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, s_id = None, h_id = None): 
@@ -32,3 +43,64 @@ async def websocket_endpoint(websocket: WebSocket, s_id = None, h_id = None):
     except WebSocketDisconnect as d:
         await websocket_manager.delete_connections(websocket, s_id, h_id)
         print(f'Websocket : {d}')
+
+
+@websocket_router.websocket("/gaze")
+async def gaze_stream_endpoint(websocket: WebSocket, u_id: str):
+    """ 주문 전, 메뉴를 보는 동안 app이 raw gaze를 조금씩 보내는 연결 (주문 시 /orders/order에서 저장된다)
+        - 인증 : Authorization: Bearer <A_Token> header, header를 보낼 수 없으면 첫 message로 {"token": <A_Token>}
+          (token이 access log에 남지 않도록 query string으로는 받지 않는다)
+        - binary message : PackedGaze 형식 (msgpack)
+        - text message : {"pages": [RawGazeModel, ...]}
+        - 응답 : {"type": "gaze", "result": "success", "samples": 추가된 sample 수} / {"type": "gaze", "result": "fail", "detail": ...}
+        주문으로 spool이 저장된 뒤에는 이 연결로 보낸 gaze를 받지 않고 연결을 닫는다. 다음 주문의 gaze는 새 연결로 보낸다.
+    """
+    await websocket.accept()
+    try:
+        token = await receive_token(websocket)
+        payload = TokenManager.get_payload('access', token)
+        if payload.get('sub') != u_id or not TokenManager.is_buyer(payload.get('scope')):
+            raise CustomException(403.1)
+        session = await gaze_spool.open(u_id)
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        await websocket.send_json({"type": "connect", "result": "falied"})
+        await websocket.close()
+        print(f'Websocket : gaze stream denied -> u_id: \'{u_id}\', {repr(e)}')
+        return
+
+    await websocket.send_json({"type": "connect", "result": "connected"})
+    while True:
+        message = await websocket.receive()
+        if message['type'] == 'websocket.disconnect':
+            break
+
+        try:
+            if message.get('bytes') is not None:
+                pages = PackedGaze.unpack(message['bytes'])
+            else:
+                pages = [RawGazeModel.parse_obj(page).dict() for page in orjson.loads(message['text'])['pages']]
+            samples = await gaze_spool.append(u_id, session, pages)
+            await websocket.send_json({"type": "gaze", "result": "success", "samples": samples})
+
+        except CustomException as e:
+            await websocket.send_json({"type": "gaze", "result": "fail", "detail": APIException().get_status(e)[1]})
+            if e.status_code == 422.73:
+                await websocket.close()
+                break
+
+        except (ValidationError, orjson.JSONDecodeError, KeyError, TypeError) as e:
+            await websocket.send_json({"type": "gaze", "result": "fail", "detail": repr(e)})
+
+
+async def receive_token(websocket: WebSocket) -> str:
+    """ Authorization header 또는 첫 message({"token": ...})에서 access token을 읽는다. """
+    authorization = websocket.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        return authorization.split(' ', 1)[1]
+
+    message = await asyncio.wait_for(websocket.receive_json(), AUTH_TIMEOUT)
+    if not isinstance(message, dict) or not isinstance(message.get('token'), str):
+        raise CustomException(401.61)
+    return message['token']